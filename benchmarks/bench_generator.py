@@ -0,0 +1,150 @@
+"""Benchmark suite for Crossword.compute_crossword throughput and fill quality.
+
+Runs a fixed restart budget from fixed seeds over several grid sizes and word lists (the bundled words.csv,
+the demo list in xwordgen_bh and synthetic dictionaries) and reports restarts/sec, placements/sec, peak
+memory and the fill achieved. Results can be saved as a JSON baseline and later runs compared against it:
+
+    python benchmarks/bench_generator.py --save baseline
+    python benchmarks/bench_generator.py --compare baseline
+
+A comparison fails (exit status 1) when throughput drops, or peak memory grows, by more than --tolerance,
+or when the fill achieved by any case changes, since the same seeds must give the same crosswords.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from wordindex import WordIndex
+from xwordgen_bh import Crossword, demo_word_list
+from xwordstats import SearchStats
+
+word_list_path = Path(__file__).resolve().parent.parent / "words.csv"
+baselines_path = Path(__file__).resolve().parent / "baselines"
+
+grid_sizes = [15, 26, 50, 100]
+seeds = [1, 2, 3]
+
+
+def synthetic_word_list(count, seed=0):
+    """Pronounceable made-up answers of 3 to 12 letters, with letters weighted roughly as in English."""
+    rng = random.Random(seed)
+    consonants, vowels = "tnshrdlcmwfgypbvkjxqz", "eaoiu"
+    consonant_weights = [9, 7, 6, 6, 6, 4, 4, 3, 2, 2, 2, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1]
+    words = []
+    for i in range(count):
+        length = rng.randint(3, 12)
+        answer = "".join(rng.choices(vowels)[0] if j % 2 else rng.choices(consonants, consonant_weights)[0]
+                         for j in range(length))
+        words.append([answer, f"Synthetic clue {i}"])
+    return words
+
+
+def word_lists(quick=False):
+    lists = {"words.csv": [[w.word, w.clue] for w in WordIndex.from_csv(word_list_path).words()],
+             "demo": list(demo_word_list),
+             "synthetic-1k": synthetic_word_list(1000)}
+    if not quick:
+        lists["synthetic-10k"] = synthetic_word_list(10000)
+    return lists
+
+
+def run_case(words, size, seed, restarts, spins, strategy):
+    # timed run, as a user would run it
+    xword = Crossword(size, size, "-", 5000, words, seed=seed)
+    start = time.perf_counter()
+    xword.compute_crossword(None, spins=spins, restarts=restarts, strategy=strategy)
+    elapsed = time.perf_counter() - start
+
+    # the same search again with counters and memory tracing on, which would skew the timing
+    stats = SearchStats()
+    tracemalloc.start()
+    counted = Crossword(size, size, "-", 5000, words, seed=seed, stats=stats)
+    counted.compute_crossword(None, spins=spins, restarts=restarts, strategy=strategy)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    restarts_done = stats.counts["restarts"]
+    return {"seconds": round(elapsed, 6),
+            "restarts": restarts_done,
+            "restarts_per_sec": round(restarts_done / elapsed, 3),
+            "placements_per_sec": round(stats.counts["words_placed"] / elapsed, 3),
+            "peak_memory_bytes": peak,
+            "words": len(xword.current_word_list),
+            "available": len(xword.available_words),
+            "density": round(xword.density(), 4)}
+
+
+def run_suite(restarts, spins, strategy, quick=False, sizes=grid_sizes):
+    results = {}
+    for list_name, words in word_lists(quick).items():
+        for size in sizes:
+            for seed in seeds:
+                key = f"{list_name}/{size}x{size}/seed{seed}"
+                results[key] = run_case(words, size, seed, restarts, spins, strategy)
+                r = results[key]
+                print(f"{key:34} {r['restarts_per_sec']:9.1f} restarts/s {r['placements_per_sec']:10.1f} placements/s "
+                      f"{r['peak_memory_bytes'] / 1024:9.0f} KiB peak  {r['words']:4}/{r['available']:<5} words "
+                      f"{r['density']:.3f} fill")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions of results against the baseline, as messages."""
+    regressions = []
+    for key, base in baseline["results"].items():
+        if key not in results:
+            continue
+        r = results[key]
+        for metric in ("restarts_per_sec", "placements_per_sec"):
+            if r[metric] < base[metric] * (1 - tolerance):
+                regressions.append(f"{key}: {metric} {r[metric]} < baseline {base[metric]}")
+        if r["peak_memory_bytes"] > base["peak_memory_bytes"] * (1 + tolerance):
+            regressions.append(f"{key}: peak_memory_bytes {r['peak_memory_bytes']} > baseline {base['peak_memory_bytes']}")
+        if (r["words"], r["density"]) != (base["words"], base["density"]):
+            regressions.append(f"{key}: fill {r['words']} words/{r['density']} changed from baseline "
+                               f"{base['words']} words/{base['density']}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark crossword generation throughput and fill quality.")
+    parser.add_argument("--restarts", type=int, default=5, help="restarts per case (default: 5)")
+    parser.add_argument("--spins", type=int, default=3, help="spins per restart (default: 3)")
+    parser.add_argument("--strategy", choices=["greedy", "backtrack"], default="greedy")
+    parser.add_argument("--sizes", type=int, nargs="+", default=grid_sizes,
+                        help=f"grid sizes (default: {' '.join(map(str, grid_sizes))})")
+    parser.add_argument("--quick", action="store_true", help="leave out the 10k word synthetic dictionary")
+    parser.add_argument("--save", metavar="NAME", help=f"save the results as {baselines_path}/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed fractional drop in throughput or growth in memory (default: 0.2)")
+    args = parser.parse_args()
+
+    params = {"restarts": args.restarts, "spins": args.spins, "strategy": args.strategy, "sizes": args.sizes,
+              "quick": args.quick}
+    results = run_suite(args.restarts, args.spins, args.strategy, args.quick, args.sizes)
+    report = {"params": params, "python": platform.python_version(), "machine": platform.machine(),
+              "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+
+    if args.save:
+        baselines_path.mkdir(exist_ok=True)
+        save_path = baselines_path / f"{args.save}.json"
+        save_path.write_text(json.dumps(report, indent=1), encoding="utf-8")
+        print(f"Saved results to {save_path}")
+    if args.compare:
+        baseline = json.loads((baselines_path / f"{args.compare}.json").read_text(encoding="utf-8"))
+        if baseline["params"] != params:
+            print(f"Warning: baseline was run with {baseline['params']}, this run with {params}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
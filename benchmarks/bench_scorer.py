@@ -0,0 +1,145 @@
+"""Micro-benchmark of Crossword.check_fit_score against the original list-of-lists, neighbour-probing scorer.
+
+Fills a grid from words.csv, then scores every in-grid placement of every word with both scorers,
+checking they agree and reporting the time taken by each. Run with `python benchmarks/bench_scorer.py`.
+"""
+
+import csv
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from xwordgen_bh import Crossword, Word
+
+word_list_path = Path(__file__).resolve().parent.parent / "words.csv"
+
+
+class ListGrid(object):
+    """The original grid storage: a list of rows of one-character strings, indexed with wrap-around.
+
+    An extra empty row and column are added, so that the original probing reads the cells off the grid as
+    clear, as the current scorer does, rather than the far edge as filled.
+    """
+    def __init__(self, xword):
+        self.empty = xword.empty
+        self.grid = [list(row) + [self.empty] for row in xword.grid_rows()] + [[self.empty] * (xword.cols + 1)]
+
+    def get_cell(self, col, row):
+        return self.grid[row-1][col-1]
+
+    def check_if_cell_clear(self, col, row):
+        try:
+            cell = self.get_cell(col, row)
+            if cell == self.empty:
+                return True
+        except IndexError:
+            pass
+        return False
+
+
+def legacy_check_fit_score(xword, col, row, vertical, word):
+    """The scorer as it was before the blocked masks, probing neighbours of a ListGrid through get_cell."""
+    if col < 1 or row < 1:
+        return 0
+
+    count, score = 1, 1
+    for letter in word.word:
+        try:
+            active_cell = xword.get_cell(col, row)
+        except IndexError:
+            return 0
+
+        if active_cell == xword.empty or active_cell == letter:
+            pass
+        else:
+            return 0
+
+        if active_cell == letter:
+            score += 1
+
+        if vertical:
+            if active_cell != letter:
+                if not xword.check_if_cell_clear(col+1, row):
+                    return 0
+                if not xword.check_if_cell_clear(col-1, row):
+                    return 0
+            if count == 1:
+                if not xword.check_if_cell_clear(col, row-1):
+                    return 0
+            if count == len(word.word):
+                if not xword.check_if_cell_clear(col, row+1):
+                    return 0
+        else:
+            if active_cell != letter:
+                if not xword.check_if_cell_clear(col, row-1):
+                    return 0
+                if not xword.check_if_cell_clear(col, row+1):
+                    return 0
+            if count == 1:
+                if not xword.check_if_cell_clear(col-1, row):
+                    return 0
+            if count == len(word.word):
+                if not xword.check_if_cell_clear(col+1, row):
+                    return 0
+
+        if vertical:
+            row += 1
+        else:
+            col += 1
+        count += 1
+
+    return score
+
+
+def load_words():
+    with word_list_path.open(mode="r", encoding="utf-8") as f:
+        return [Word(row["answer"], row["clue"]) for row in csv.DictReader(f)]
+
+
+def time_scorer(scorer, placements, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        for col, row, vertical, word in placements:
+            scorer(col, row, vertical, word)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    words = load_words()
+    xword = Crossword(26, 26, "-", 5000, words, seed=0)
+    xword.compute_crossword(None, spins=3, restarts=200)
+    print(f"Grid holds {len(xword.current_word_list)} of {len(words)} words")
+
+    # every position of every word on the grid in both directions, colliding ones included
+    placements = [(col, row, vertical, word)
+                  for word in words
+                  for vertical in (0, 1)
+                  for row in range(1, xword.rows + 1 - (word.length - 1 if vertical else 0))
+                  for col in range(1, xword.cols + 1 - (0 if vertical else word.length - 1))]
+
+    list_grid = ListGrid(xword)
+
+    def legacy(col, row, vertical, word):
+        return legacy_check_fit_score(list_grid, col, row, vertical, word)
+
+    # the placements suggest_coord hands to the scorer during a search: each crosses a letter on the grid
+    candidates = [(col, row, vertical, word)
+                  for word in words
+                  for col, row, vertical, colrow, score in xword.suggest_coord(word)]
+
+    # the legacy scorer also let a word be laid along one already placed the same way; only that may differ
+    mismatches = [p for p in placements
+                  if legacy(*p) != xword.check_fit_score(*p) and xword.fit_rejection_reason(*p) != "overlap"]
+    if mismatches:
+        raise SystemExit(f"Scorers disagree on {len(mismatches)} placements, e.g. {mismatches[0]}")
+
+    repeat = 3
+    for name, batch in (("all placements", placements), ("suggested candidates", candidates * 50)):
+        t_legacy = time_scorer(legacy, batch, repeat)
+        t_masked = time_scorer(xword.check_fit_score, batch, repeat)
+        calls = len(batch) * repeat
+        print(f"{name}: {calls} calls per scorer")
+        print(f"  legacy: {t_legacy:.3f}s ({t_legacy / calls * 1e6:.2f}us/call)")
+        print(f"  masked: {t_masked:.3f}s ({t_masked / calls * 1e6:.2f}us/call)")
+        print(f"  speedup: {t_legacy / t_masked:.1f}x")
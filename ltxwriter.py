@@ -0,0 +1,98 @@
+"""Stream a crossword out as a LaTeX document.
+
+Each part of the document is produced by a generator of lines, taken straight from the cells and numbered words
+of a CrosswordResult, so that nothing bigger than a row or a clue is built up in memory before it is written.
+"""
+
+import itertools
+
+ltx_doc_start_template = \
+"""% !TEX TS-program = pdflatex
+% xword-seed: {seed}
+% xword-params: {params}
+\\documentclass[12pt]{{article}}
+\\usepackage{{ltxcrossword}}
+
+\\pagestyle{{fancy}}
+\\makeheadersandfooters{{USWACS Crossword: {crossword_uuid}}}
+
+\\begin{{document}}
+"""
+ltx_doc_end = "\\end{document}\n"
+
+
+def iter_ltx_doc_start(crossword_uuid, seed, params):
+    params = " ".join(f"{k}={v}" for k, v in params.items())
+    yield ltx_doc_start_template.format(crossword_uuid=crossword_uuid, seed=seed, params=params)
+
+
+def iter_ltxtable(result):
+    yield "\\begin{table}[h!]\n" \
+          "\\centering\\ttfamily\\tiny\n" \
+          "\\setlength{\\tabcolsep}{2pt}\n" \
+          "\\newlength{\\rowh}\n" \
+          "\\setlength{\\rowh}{0.02\\textwidth}\n"
+    yield from iter_ltxtabularx(result)
+    yield "\\end{table}\n"
+
+
+def iter_ltxtabularx(result):
+    """Yield the tabularx of the crossword grid row by row, numbering the cells where words start."""
+    numbers = result.numbers()
+
+    def xwordcell_to_ltxcell(col, row, cell):
+        if (col, row) in numbers:
+            return str(numbers[(col, row)])
+        elif cell == result.empty:
+            return "\\cellcolor{black!5}"
+        else:
+            return "\\cellcolor{white}"
+
+    yield f"\\begin{{tabularx}}{{1\\textwidth}}{{*{{{result.cols}}}{{|X}}|}}\n" \
+          "\\arrayrulecolor{fader-gray}\n" \
+          "\\hline\n"
+    for row, xword_row in enumerate(result.cells, 1):
+        row_data = " & ".join(xwordcell_to_ltxcell(col, row, cell) for col, cell in enumerate(xword_row, 1))
+        sep = "\n" if row > 1 else ""
+        yield f"{sep}{row_data} \\tabularnewline[\\rowh] \\hline"
+    yield "\n\\end{tabularx}\n"
+
+
+def iter_xword_clues(result, word_lengths):
+    """Yield the across and down clue columns for the numbered words, in the order of result.words.
+
+    word_lengths maps each clue to the lengths of the words in its answer; answers not in it count as one word.
+    """
+    def ltx_clue(word):
+        wlens = word_lengths.get(word.clue, [word.length])
+        return f"\\textbf{{{word.number}.}} \\textit{{{wlens}:}} {word.clue}\\\\\n"
+
+    def minipage(heading, clue_words):
+        yield "\\begin{minipage}[t]{0.47\\linewidth}\n"
+        yield "\\vspace{0pt}\n"
+        yield f"{{\\Centering\\underline{{\\textsc{{{heading}}}}}\\\\~\\\\}}\n"
+        yield "\\RaggedRight\n"
+        yield "\\fontsize{10pt}{10pt}\\selectfont\n"
+        yield from map(ltx_clue, clue_words)
+        yield "\\end{minipage}"
+
+    yield "\\pagebreak\n"
+    yield "\\centering\n"
+    yield from minipage("Across", result.across())
+    yield "\\hspace{4mm}\\textcolor{gray}{\\vline width 0.1mm}\\hspace{3mm}~\n"
+    yield from minipage("Down", result.down())
+    yield "\\\\\n"
+
+
+def iter_solution_comment(result):
+    for xword_row in result.cells:
+        yield f"%  {' '.join(xword_row)} \n"
+
+
+def write_ltx_document(f, result, word_lengths, crossword_uuid, seed, params):
+    """Stream the whole LaTeX document for a CrosswordResult to the file-like object f."""
+    f.writelines(itertools.chain(iter_ltx_doc_start(crossword_uuid, seed, params),
+                                 iter_ltxtable(result),
+                                 iter_xword_clues(result, word_lengths),
+                                 [ltx_doc_end],
+                                 iter_solution_comment(result)))
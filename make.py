@@ -1,13 +1,178 @@
+"""Compile generated crossword .tex files to PDF, many at a time.
+
+Each file is compiled in its own temporary directory, so concurrent runs never share .aux/.log/.out files and
+nothing is left to clean up. A PDF is only rebuilt when the hash of its .tex file, the style file or the compiler
+command has changed since it was last built; the hashes are kept in a manifest in the output directory.
+
+    python make.py                       # every .tex file next to this script
+    python make.py puzzles/ --jobs 8     # every .tex file in puzzles/
+    python make.py a.tex --compiler "python stub_latex.py"
+
+The compiler is run as `<compiler> -interaction=nonstopmode -halt-on-error <name>.tex` in the temporary
+directory and must leave <name>.pdf there; a stub that does just that can stand in for pdflatex in tests.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-texf = Path(sys.argv[1]).resolve()
 p = Path(__file__).parent
-print(f"Running make.py on {texf}")
-command = ["pdflatex.exe", str(texf)]
-subprocess.run(command)
-print("Cleaning up...")
-Path(f"{texf.parent}/{texf.stem}.aux").unlink()
-Path(f"{texf.parent}/{texf.stem}.log").unlink()
-Path(f"{texf.parent}/{texf.stem}.out").unlink()
+sty_path = p / "ltxcrossword.sty"
+# the compiler command as a list of arguments, e.g. LATEX_COMPILER="python stub_latex.py"
+default_compiler = tuple(shlex.split(os.environ.get("LATEX_COMPILER",
+                                                    "pdflatex.exe" if sys.platform == "win32" else "pdflatex")))
+manifest_name = ".make-manifest.json"
+
+
+def build_hash(texf, compiler):
+    h = hashlib.sha256()
+    h.update(texf.read_bytes())
+    h.update(sty_path.read_bytes())
+    h.update(" ".join(compiler).encode("utf-8"))
+    return h.hexdigest()
+
+
+def log_tail(log_path, lines=10):
+    try:
+        return "".join(log_path.read_text(encoding="utf-8", errors="replace").splitlines(keepends=True)[-lines:])
+    except OSError:
+        return ""
+
+
+def compile_tex(texf, out_dir, compiler, timeout=None):
+    """Compile one .tex file in a temporary directory and move its PDF to out_dir.
+
+    Returns (ok, message); on failure the compiler's log is kept in out_dir as <name>.log.
+    """
+    with tempfile.TemporaryDirectory(prefix=f"{texf.stem}-") as tmp:
+        tmp = Path(tmp)
+        shutil.copy(texf, tmp / texf.name)
+        env = dict(os.environ, TEXINPUTS=f"{p}{os.pathsep}{os.environ.get('TEXINPUTS', '')}")
+        command = [*compiler, "-interaction=nonstopmode", "-halt-on-error", texf.name]
+        try:
+            completed = subprocess.run(command, cwd=tmp, env=env, stdin=subprocess.DEVNULL, capture_output=True,
+                                       timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False, f"timed out after {timeout} seconds"
+        except OSError as e:
+            return False, f"could not run {compiler[0]}: {e}"
+        pdf_path = tmp / f"{texf.stem}.pdf"
+        if completed.returncode == 0 and pdf_path.exists():
+            shutil.move(pdf_path, out_dir / pdf_path.name)
+            return True, ""
+        log_path = tmp / f"{texf.stem}.log"
+        tail = log_tail(log_path) or completed.stdout.decode("utf-8", errors="replace")[-2000:]
+        if log_path.exists():
+            shutil.move(log_path, out_dir / log_path.name)
+        return False, f"exit status {completed.returncode}\n{tail.rstrip()}"
+
+
+def find_tex_files(paths):
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            yield from sorted(path.glob("*.tex"))
+        else:
+            yield path
+
+
+def build(tex_files, out_dir=None, compiler=default_compiler, jobs=None, force=False, timeout=None):
+    """Compile the .tex files that have changed since they were last built, up to jobs at a time.
+
+    PDFs go to out_dir, or next to each .tex file. Yields (tex file, status, seconds, message) in order of
+    completion, where status is "built", "skipped" (up to date) or "failed"; a file whose PDF another file of
+    the same name is already building into the same directory fails.
+    """
+    compiler = list(compiler)
+    jobs = jobs or os.cpu_count() or 1
+    manifests = {}
+    sources = {} # (pdf directory, name) -> the .tex file building that PDF
+
+    def manifest(pdf_dir):
+        if pdf_dir not in manifests:
+            try:
+                manifests[pdf_dir] = json.loads((pdf_dir / manifest_name).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                manifests[pdf_dir] = {}
+        return manifests[pdf_dir]
+
+    def save_manifest(pdf_dir):
+        tmp_path = pdf_dir / f"{manifest_name}.tmp"
+        tmp_path.write_text(json.dumps(manifests[pdf_dir], indent=1, sort_keys=True), encoding="utf-8")
+        tmp_path.replace(pdf_dir / manifest_name)
+
+    def run(texf, pdf_dir):
+        start = time.perf_counter()
+        ok, message = compile_tex(texf, pdf_dir, compiler, timeout)
+        return ok, time.perf_counter() - start, message
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool: # each job waits on its own compiler process
+        futures = {}
+        for texf in tex_files:
+            texf = Path(texf).resolve()
+            pdf_dir = Path(out_dir).resolve() if out_dir is not None else texf.parent
+            try:
+                digest = build_hash(texf, compiler)
+            except OSError as e: # e.g. a path that does not exist
+                yield texf, "failed", 0.0, f"could not read {e.filename}: {e.strerror}"
+                continue
+            other = sources.setdefault((pdf_dir, texf.stem), texf)
+            if other != texf:
+                yield texf, "failed", 0.0, f"{other} also builds {pdf_dir / texf.stem}.pdf"
+                continue
+            pdf_dir.mkdir(parents=True, exist_ok=True)
+            if not force and manifest(pdf_dir).get(texf.stem) == digest and (pdf_dir / f"{texf.stem}.pdf").exists():
+                yield texf, "skipped", 0.0, ""
+                continue
+            futures[pool.submit(run, texf, pdf_dir)] = texf, pdf_dir, digest
+        for future in as_completed(futures):
+            texf, pdf_dir, digest = futures[future]
+            ok, seconds, message = future.result()
+            if ok:
+                manifest(pdf_dir)[texf.stem] = digest
+                save_manifest(pdf_dir) # after every build, so an interrupted run keeps what it finished
+            else:
+                manifest(pdf_dir).pop(texf.stem, None)
+            yield texf, "built" if ok else "failed", seconds, message
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile crossword .tex files to PDF in parallel.")
+    parser.add_argument("paths", nargs="*", type=Path, default=[p],
+                        help=".tex files, or directories of them (default: the directory of this script)")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="number of files to compile at a time (default: number of CPUs)")
+    parser.add_argument("--out-dir", type=Path, default=None,
+                        help="directory to write the PDFs to (default: next to each .tex file)")
+    parser.add_argument("--compiler", type=shlex.split, default=default_compiler,
+                        help=f"LaTeX compiler command, e.g. a stub for tests "
+                             f"(default: $LATEX_COMPILER or {shlex.join(default_compiler)})")
+    parser.add_argument("--force", action="store_true", help="rebuild PDFs that are up to date")
+    parser.add_argument("--timeout", type=float, default=None, help="give up on a file after this many seconds")
+    args = parser.parse_args()
+
+    tex_files = list(find_tex_files(args.paths))
+    print(f"Running make.py on {len(tex_files)} file(s)...")
+    start = time.perf_counter()
+    counts = {"built": 0, "skipped": 0, "failed": 0}
+    for n, (texf, status, seconds, message) in enumerate(
+            build(tex_files, args.out_dir, args.compiler, args.jobs, args.force, args.timeout), 1):
+        counts[status] += 1
+        if status == "failed":
+            print(f"[{n}/{len(tex_files)}] FAILED {texf.name} after {seconds:.2f}s: {message}")
+        elif status == "built":
+            print(f"[{n}/{len(tex_files)}] Built {texf.stem}.pdf in {seconds:.2f}s")
+        else:
+            print(f"[{n}/{len(tex_files)}] Skipped {texf.name} (up to date)")
+    print(f"Finished in {time.perf_counter() - start:.2f}s: {counts['built']} built, {counts['skipped']} skipped, "
+          f"{counts['failed']} failed")
+    sys.exit(1 if counts["failed"] else 0)
@@ -1,164 +1,454 @@
-import csv
-import itertools
+"""Make LaTeX crosswords from a word list, from the command line or as a library.
+
+    python mkxwordltx.py --seed 1 --restarts 20      # or `mkxwordltx ...` once installed with pip install -e .
+
+    from mkxwordltx import generate
+    result = generate(seed=1, restarts=20)          # a CrosswordResult, no files written
+
+Only the modules a run needs are imported, when it first needs them: the LaTeX writer when a document is
+written, the CSV word list compiler when a word list is loaded, the pattern filler and puzzle store when they are
+used. Importing this module has no side effects, so a long-running process can import it once and call
+generate for each puzzle; word lists are loaded once per process.
+"""
+
+import io
 import random
 import sys
 import uuid
 from pathlib import Path
-from xwordgen_bh import Crossword
-
-_crossword_uuid = uuid.uuid4()
 
 word_list_path = Path(__file__).parent / "words.csv"
-output_path = Path(__file__).parent / f"{_crossword_uuid.hex}.tex"
-ltx_doc_start = \
-"""% !TEX TS-program = pdflatex
-\\documentclass[12pt]{{article}}
-\\usepackage{{ltxcrossword}}
-
-\\pagestyle{{fancy}}
-\\makeheadersandfooters{{USWACS Crossword: {_crossword_uuid}}}
-
-\\begin{{document}}
-""".format(_crossword_uuid=_crossword_uuid)
-ltx_doc_end = "\\end{document}\n"
-
-
-def make_ltxtable():
-    return "\\begin{table}[h!]\n" \
-           "\\centering\\ttfamily\\tiny\n" \
-           "\\setlength{\\tabcolsep}{2pt}\n" \
-           "\\newlength{\\rowh}\n" \
-           "\\setlength{\\rowh}{0.02\\textwidth}\n", \
-           "\\end{table}\n"
-
-
-def make_ltxtabularx(xword_grid):
-    def xwordcell_to_ltxcell(cell):
-        if cell == "-":
-            return "\\cellcolor{black!5}"
-        elif cell == "w":
-            return "\\cellcolor{white}"
+cache_path = Path(__file__).parent / ".cache"
+store_path = cache_path / "puzzles.sqlite3"
+grid_cols, grid_rows = 25, 25
+symmetric_size = 15 # generated patterns much larger than this seldom fill completely within a search
+
+
+def make_crossword_uuid(seed):
+    # Derived from the seed so that a reproduced puzzle also gets the same name
+    return uuid.UUID(int=random.Random(seed).getrandbits(128), version=4)
+
+
+def filter_word_randomly(word, rng=random):
+    return rng.choice([True, True, False])
+
+
+# (path, size, modification time, mapped) -> loaded word list, for processes that make many puzzles
+_word_lists = {}
+
+
+def load_word_list(path=word_list_path, cache_dir=cache_path, mapped=False):
+    """Load the word list through its compiled, cached WordIndex, once per process while the file is unchanged.
+
+    Returns the word list as Word objects and a dict of the lengths of the words in each answer, keyed by clue.
+    With mapped, the word list is a memory-mapped WordStore instead, to take a sample of words from for each
+    crossword, and the lengths are known for the clues loaded from it.
+    """
+    st = Path(path).stat()
+    key = (str(path), st.st_size, st.st_mtime_ns, mapped)
+    if key not in _word_lists:
+        if mapped:
+            from wordstore import load_word_store
+            words = load_word_store(path, cache_dir)
         else:
-            return cell
-
-    tabularx_init = "\\begin{tabularx}{1\\textwidth}{*{25}{|X}|}\n" \
-                    "\\arrayrulecolor{fader-gray}\n" \
-                    "\\hline\n"
-    rows = []
-    # Split the xword grid into individual rows
-    # Hack: Remove the last row that is unfilled due to a bug in xwordgen_bh
-    xword_rows = xword_grid.splitlines()[0:-1]
-    # print(len(xword_rows))
-    for xword_row in xword_rows:
-        # Split the xword row into cells, removing the empty string at the end
-        # Hack, remove the last column - it is unfilled by xwordgen_bh
-        cells = xword_row.split(" ")
-        cells = cells[0:-2]
-        # print(cells)
-        # print(len(cells))
-        # Convert xword cells into LaTeX cells
-        cells = map(xwordcell_to_ltxcell, cells)
-        # Join the LaTex cells together to make a LaTeX row data
-        row_data = " & ".join(cells)
-        # Create the full row and append to rows
-        row = f"{row_data} \\tabularnewline[\\rowh] \\hline"
-        rows.append(row)
-
-    all_rows = "\n".join(rows)
-    tabularx_end = "\n\\end{tabularx}\n"
-    return f"{tabularx_init}{all_rows}{tabularx_end}"
-
-
-def make_xword_ltxtable(xword_grid):
-    ltxtable_init, ltxtable_end = make_ltxtable()
-    ltxtabularx = make_ltxtabularx(xword_grid)
-    return f"{ltxtable_init}{ltxtabularx}{ltxtable_end}"
-
-
-def make_xword_clues(xword_legend, word_lengths):
-    def adjust_clue(clue):
-        parts = clue.split(":")
-        wordpos, cluetext = parts[0], parts[1].lstrip()
-        wordnum = wordpos.split(".")[0]
-        wlens = word_lengths[cluetext]
-        ltx_clue_text = f"\\textbf{{{wordnum}.}} \\textit{{{wlens}:}} {cluetext}"
-        return ltx_clue_text
-
-    clues = ["\\pagebreak\n",
-             "\\centering\n"]
-    mpla = ["\\begin{minipage}[t]{0.47\\linewidth}\n",
-            "\\vspace{0pt}\n",
-            "{\\Centering\\underline{\\textsc{Across}}\\\\~\\\\}\n",
-            "\\RaggedRight\n",
-            "\\fontsize{10pt}{10pt}\\selectfont\n"]
-    mprd = ["\\begin{minipage}[t]{0.47\\linewidth}\n",
-            "\\vspace{0pt}\n",
-            "{\\Centering\\underline{\\textsc{Down}}\\\\~\\\\}\n",
-            "\\RaggedRight\n",
-            "\\fontsize{10pt}{10pt}\\selectfont\n"]
-    for clue in xword_legend.splitlines():
-        position = clue.split(":")[0]
-        if "across" in position:
-            mpla.append(f"{adjust_clue(clue)}\\\\\n")
-        elif "down" in position:
-            adjust_clue(clue)
-            mprd.append(f"{adjust_clue(clue)}\\\\\n")
+            from wordindex import load_word_index
+            words = load_word_index(path, cache_dir)
+        _word_lists.clear() # keep only the latest list
+        _word_lists[key] = (words if mapped else words.words()), words.word_lengths()
+    return _word_lists[key]
+
+
+def search_params(time=None, restarts=None, patience=None, target_words=None, target_density=None,
+                  strategy=None, pattern=None, sample=None, size=None, depth=None, branching=None):
+    """The search dict of make_crossword; without time, restarts or patience the search takes 10 seconds.
+
+    size is the number of rows and columns of a square grid, by default 25, or 15 for symmetric patterns; a
+    pattern file has its own. depth and branching tune the backtrack strategy, see Crossword.backtrack_fill.
+    Raises ValueError for options a pattern fill, or the greedy strategy, does not use.
+    """
+    if pattern is not None:
+        unused = [name for name, value in (("patience", patience), ("target words", target_words),
+                                           ("target density", target_density), ("strategy", strategy),
+                                           ("depth", depth), ("branching", branching))
+                  if value is not None]
+        if unused:
+            raise ValueError(f"a pattern fill takes no {', '.join(unused)}")
+        if size is not None and pattern != "symmetric":
+            raise ValueError("a pattern file sets its own grid size")
+    if size is not None and size < 3:
+        raise ValueError("the grid size must be at least 3")
+    if size is not None and pattern == "symmetric" and size % 2 == 0:
+        raise ValueError("symmetric patterns need an odd grid size")
+    if size is None and pattern == "symmetric":
+        size = symmetric_size
+    if strategy != "backtrack" and (depth is not None or branching is not None):
+        raise ValueError("depth and branching are options of the backtrack strategy")
+    if (depth is not None and depth < 0) or (branching is not None and branching < 1):
+        raise ValueError("the depth must be at least 0 and the branching at least 1")
+    if time is None and restarts is None and patience is None:
+        time = 10
+    search = {"time": time, "restarts": restarts, "patience": patience, "target_words": target_words,
+              "target_density": target_density, "spins": 3, "strategy": strategy or "greedy",
+              "pattern": str(pattern) if pattern is not None else None, "sample": sample, "size": size}
+    if strategy == "backtrack":
+        search.update(depth=depth, branching=branching) # None for the defaults of compute_crossword
+    return search
+
+
+def grid_size(search):
+    """(cols, rows) of the grid of a search: its size, or the default for a pattern file or free-form grid."""
+    size = search.get("size")
+    return (size, size) if size else (grid_cols, grid_rows)
+
+
+def check_pattern(word_list, search):
+    """Before any search, read and check the pattern of a search, or that symmetric ones can be made for the word
+    list, a list of Word objects or a WordStore; raises OSError or ValueError if not."""
+    from xwordpattern import BlockPattern
+    if search.get("pattern") is None:
+        return
+    if search["pattern"] != "symmetric":
+        BlockPattern.from_file(search["pattern"]).slots()
+        return
+    cols, rows = grid_size(search)
+    if hasattr(word_list, "answer_lengths"): # a WordStore, with the words of each length indexed
+        lengths = {n: len(word_list.with_length(n)) for n in word_list.answer_lengths if n <= max(cols, rows)}
+    else:
+        lengths = {}
+        for word in word_list:
+            if word.length <= max(cols, rows):
+                lengths[word.length] = lengths.get(word.length, 0) + 1
+    BlockPattern.symmetric(cols, rows, lengths, random.Random(0))
+
+
+def make_crossword(word_list, seed, search, workers=1, stats=None):
+    """Select words from the word list and search for a crossword, all driven by the seed."""
+    from xwordgen_bh import Crossword
+    rng = random.Random(seed)
+    cols, rows = grid_size(search)
+    if search.get("sample"):
+        # Only the words sampled from a word store are read, and only the clues of those placed
+        word_list = word_list.sample(search["sample"], rng, max_length=max(cols, rows))
+    if search.get("pattern"):
+        return make_pattern_crossword(word_list, rng, search, stats), word_list
+    if not search.get("sample"):
+        # Remove some words from the long word list at random
+        # This increases our chance of getting more shorter words in the crossword
+        word_list = [word for word in word_list if filter_word_randomly(word, rng)]
+    xword = Crossword(cols, rows, "-", 5000, word_list, seed=rng.getrandbits(64), stats=stats)
+    xword.compute_crossword(search["time"], spins=search["spins"], workers=workers,
+                            restarts=search["restarts"], patience=search["patience"],
+                            target_words=search["target_words"], target_density=search["target_density"],
+                            strategy=search["strategy"],
+                            **{name: search[name] for name in ("depth", "branching") if search.get(name) is not None})
+    return xword, word_list
+
+
+def make_pattern_crossword(word_list, rng, search, stats=None):
+    """Fill a block pattern from the whole word list: the pattern file given, or generated symmetric patterns."""
+    from xwordpattern import BlockPattern, PatternCrossword
+    if search["pattern"] == "symmetric":
+        pattern, pattern_cache = None, cache_path / "patterns"
+    else:
+        pattern, pattern_cache = BlockPattern.from_file(search["pattern"]), None
+    cols, rows = grid_size(search)
+    xword = PatternCrossword(cols, rows, "-", word_list, seed=rng.getrandbits(64), pattern=pattern,
+                             pattern_cache=pattern_cache, stats=stats)
+    xword.compute_crossword(search["time"], restarts=search["restarts"])
+    return xword
+
+
+def search_failed(xword):
+    """Whether a search placed no words, or left a pattern partly filled with runs of letters that are not words."""
+    return not xword.current_word_list or getattr(xword, "complete", None) is False
+
+
+def generate(seed=None, word_list=None, *, time=None, restarts=None, patience=None, target_words=None,
+             target_density=None, strategy=None, pattern=None, sample=None, size=None, depth=None, branching=None,
+             workers=1, stats=None):
+    """Make a crossword and return it as a CrosswordResult, without writing any files.
+
+    word_list is the path of a CSV word list (default: words.csv), or a list of Word objects or [answer, clue]
+    pairs, or with sample a WordStore. The other options are those of the command line; pattern is the path of
+    a block pattern file, or "symmetric", and sample the number of words to take from a memory-mapped word list.
+    Without a seed one is drawn at random; the same seed and options with restarts instead of time give the same
+    crossword as the command line, and the result records that seed. Options a pattern fill does not use raise
+    ValueError, and a search that fails to fill the grid within its budget, see search_failed, RuntimeError.
+    """
+    search = search_params(time, restarts, patience, target_words, target_density, strategy, pattern, sample, size,
+                           depth, branching)
+    if pattern is not None and workers > 1:
+        raise ValueError("a pattern fill runs on one worker")
+    if seed is None:
+        seed = random.randrange(2**32)
+    if word_list is None or isinstance(word_list, (str, Path)):
+        word_list, _ = load_word_list(word_list_path if word_list is None else Path(word_list), mapped=bool(sample))
+    xword, word_list = make_crossword(word_list, seed, search, workers, stats)
+    if search_failed(xword):
+        raise RuntimeError(f"could not fill the grid from {len(word_list)} words within the budget")
+    return xword.result(seed)
+
+
+def save_ltx_document(output_path, result, word_lengths, crossword_uuid, seed, params):
+    from ltxwriter import write_ltx_document
+    with output_path.open(mode="w", encoding="utf-8") as f:
+        write_ltx_document(f, result, word_lengths, crossword_uuid, seed, params)
+
+
+def save_json(output_path, result):
+    with output_path.open(mode="w", encoding="utf-8") as f:
+        f.write(result.to_json(indent=1))
+
+
+def puzzle_key(word_list_hash, seed, search, workers=1):
+    """The key of the puzzle for a seed in the puzzle store."""
+    from wordindex import file_hash
+    from xwordstore import request_key
+    params = dict(search, workers=workers)
+    if params.get("pattern") not in (None, "symmetric"): # a pattern file may change under the same name
+        params["pattern"] = file_hash(params["pattern"])
+    return request_key(word_list_hash, *grid_size(search), seed, params)
+
+
+def make_puzzle(word_list, word_lengths, seed, out_dir, search, outputs=None, workers=1, store=None,
+                word_list_hash=None, max_similarity=None):
+    """Make the crossword for a seed and write its .tex file, and any other outputs, to out_dir.
+
+    outputs may turn on "json", the grid and numbered words as .json, and "stats", the search stats as
+    .stats.jsonl, written only for a puzzle searched for and kept. With a PuzzleStore and the hash of the word
+    list, a puzzle made before for the same seed and search is taken from the store instead of searched for
+    again, and a new puzzle is added to it; with max_similarity as well, a new puzzle with at least that share of
+    its answers in common with a stored one is a duplicate and not written.
+
+    A failed search, see search_failed, is neither written nor stored.
+
+    Returns the path of the .tex file, the CrosswordResult and a summary: "status" ("made", "cached", "duplicate"
+    or "failed"), "used" and "available" words, "cycles", "complete" for pattern fills and, for a duplicate,
+    "duplicate_of", the name of the puzzle it duplicates.
+    """
+    outputs = outputs or {}
+    out_dir.mkdir(parents=True, exist_ok=True) # before the search, so a bad directory fails at once
+    crossword_uuid = make_crossword_uuid(seed)
+    output_path = out_dir / f"{crossword_uuid.hex}.tex"
+    key = puzzle_key(word_list_hash, seed, search, workers) if store is not None else None
+    stored = store.get(key) if store is not None else None
+    stats = None
+    if stored is not None:
+        _, result, summary = stored
+        summary = dict(summary, status="cached")
+    else:
+        if outputs.get("stats"):
+            from xwordstats import SearchStats
+            stats = SearchStats(io.StringIO()) # written out once the puzzle is known to be kept
+            xword, word_list = make_crossword(word_list, seed, search, workers, stats)
+            stats.emit_summary()
         else:
-            raise Exception(f"Bad clue position '{position}' not across or down!")
+            xword, word_list = make_crossword(word_list, seed, search, workers)
+        result = xword.result(seed)
+        summary = {"status": "made", "used": len(xword.current_word_list), "available": len(word_list),
+                   "cycles": xword.debug, "complete": getattr(xword, "complete", None)}
+        if search_failed(xword):
+            return output_path, result, dict(summary, status="failed")
+        if store is not None:
+            duplicate = store.put(key, crossword_uuid.hex, result, summary, seed=seed,
+                                  params=dict(search, workers=workers), max_similarity=max_similarity)
+            if duplicate is not None:
+                return output_path, result, dict(summary, status="duplicate", duplicate_of=duplicate[0])
+    save_ltx_document(output_path, result, word_lengths, crossword_uuid, seed, dict(search, workers=workers))
+    if outputs.get("json"):
+        save_json(output_path.with_suffix(".json"), result)
+    if stats is not None:
+        output_path.with_suffix(".stats.jsonl").write_text(stats.stream.getvalue(), encoding="utf-8")
+    return output_path, result, summary
 
-    mpla.append("\\end{minipage}")
-    mprd.append("\\end{minipage}")
 
-    parts = itertools.chain(clues, mpla,
-                            ["\\hspace{4mm}\\textcolor{gray}{\\vline width 0.1mm}\\hspace{3mm}~\n"],
-                            mprd, ["\\\\\n"])
-    return "".join(parts)
+# The word list of a batch, loaded once by the parent and handed to each worker process once,
+# and the worker's own connection to the puzzle store
+_batch_word_list, _batch_word_lengths, _batch_store, _batch_word_list_hash = None, None, None, None
 
 
-def filter_word_randomly(word):
-    return random.choice([True, True, False])
+def _init_batch_worker(word_list, word_lengths, store_path=None, word_list_hash=None):
+    global _batch_word_list, _batch_word_lengths, _batch_store, _batch_word_list_hash
+    _batch_word_list, _batch_word_lengths = word_list, word_lengths
+    if store_path is not None:
+        from xwordstore import PuzzleStore
+        _batch_store = PuzzleStore(store_path)
+    _batch_word_list_hash = word_list_hash
 
 
-if __name__ == '__main__':
+def _make_batch_puzzle(seed, out_dir, search, outputs, max_similarity):
+    output_path, result, summary = make_puzzle(_batch_word_list, _batch_word_lengths, seed, out_dir, search, outputs,
+                                               store=_batch_store, word_list_hash=_batch_word_list_hash,
+                                               max_similarity=max_similarity)
+    return seed, output_path, summary
+
+
+def make_batch(word_list, word_lengths, seeds, out_dir, search, workers=1, outputs=None, store_path=None,
+               word_list_hash=None, max_similarity=None):
+    """Make a puzzle for each seed across a pool of worker processes.
+
+    Each .tex file is written by its worker as soon as its puzzle is done; with a puzzle store at store_path,
+    puzzles are taken from and added to it as by make_puzzle, and duplicates are skipped. Yields
+    (seed, output path, summary) in order of completion.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(word_list, word_lengths, store_path, word_list_hash)) as pool:
+        futures = [pool.submit(_make_batch_puzzle, seed, out_dir, search, outputs, max_similarity) for seed in seeds]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Make a LaTeX crossword from the word list.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes searching for the crossword in parallel, "
+                             "or making puzzles in parallel with --count (default: 1)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the word selection and search, or for the puzzle seeds with --count "
+                             "(default: random)")
+    parser.add_argument("--count", type=int, default=None,
+                        help="make a batch of this many puzzles with distinct seeds")
+    parser.add_argument("--word-list", type=Path, default=word_list_path,
+                        help="CSV word list with answer and clue columns (default: words.csv next to this script)")
+    parser.add_argument("--sample", type=int, default=None,
+                        help="memory-map the word list and take this many words from it for each crossword, "
+                             "for word lists too big to load whole")
+    parser.add_argument("--out-dir", type=Path, default=Path(__file__).parent,
+                        help="directory to write the .tex files to (default: next to this script)")
+    parser.add_argument("--json", action="store_true",
+                        help="also write the grid and numbered words of each crossword to a .json file")
+    parser.add_argument("--stats", action="store_true",
+                        help="also write the search counters and timings of each crossword to a .stats.jsonl file")
+    parser.add_argument("--strategy", choices=["greedy", "backtrack"], default=None,
+                        help="search strategy: greedy restarts or depth-limited backtracking (default: greedy)")
+    parser.add_argument("--depth", type=int, default=None,
+                        help="with --strategy backtrack, the levels of words to branch on before filling the rest "
+                             "greedily (default: 4)")
+    parser.add_argument("--branching", type=int, default=None,
+                        help="with --strategy backtrack, the placements tried for the word at each level (default: 2)")
+    parser.add_argument("--restarts", type=int, default=None,
+                        help="stop after this many restarts instead of after a fixed time; "
+                             "with --seed this reproduces the same crossword")
+    parser.add_argument("--time", type=float, default=None,
+                        help="stop after this many seconds (default: 10, unless --restarts or --patience is given)")
+    parser.add_argument("--patience", type=int, default=None,
+                        help="stop after this many restarts in a row without a better crossword")
+    parser.add_argument("--target-words", type=int, default=None,
+                        help="stop once the crossword holds this many words")
+    parser.add_argument("--target-density", type=float, default=None,
+                        help="stop once this fraction of the grid is filled")
+    grid = parser.add_mutually_exclusive_group()
+    grid.add_argument("--pattern", type=Path, default=None,
+                      help="fill the block pattern in this file, rows of '#' for blocks and '.' for letters")
+    grid.add_argument("--symmetric", action="store_true",
+                      help="fill generated patterns with rotational symmetry, reusing cached ones")
+    parser.add_argument("--size", type=int, default=None,
+                        help=f"rows and columns of the grid (default: {grid_cols}, or {symmetric_size} with "
+                             f"--symmetric; a --pattern file sets its own)")
+    parser.add_argument("--puzzle-store", type=Path, default=store_path,
+                        help=f"SQLite store of the puzzles made, reused for repeated seeds and searches "
+                             f"(default: {store_path})")
+    parser.add_argument("--no-puzzle-store", action="store_true",
+                        help="always search, and do not keep the puzzles made")
+    parser.add_argument("--max-similarity", type=float, default=0.8,
+                        help="with --count, skip puzzles sharing at least this fraction of their answers with a "
+                             "stored puzzle (default: 0.8)")
+    args = parser.parse_args(argv)
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+
+    pattern = "symmetric" if args.symmetric else args.pattern
+    try:
+        search = search_params(args.time, args.restarts, args.patience, args.target_words, args.target_density,
+                               args.strategy, pattern, args.sample, args.size, args.depth, args.branching)
+    except ValueError as e:
+        parser.error(str(e))
+    if pattern is not None and args.workers > 1 and args.count is None:
+        parser.error("a pattern fill runs on one worker; --workers only makes puzzles in parallel with --count")
+    time = search["time"]
+    budget = ", ".join(b for b in [f"{time} seconds" if time is not None else None,
+                                   f"{args.restarts} restarts" if args.restarts is not None else None,
+                                   f"{args.patience} restarts without improvement" if args.patience is not None else None]
+                       if b is not None)
+
+    try:
+        args.out_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        parser.error(f"cannot create --out-dir {args.out_dir}: {e.strerror}")
+
+    outputs = {"json": args.json, "stats": args.stats}
+
     print("Loading word list from file...")
-    word_list = []
-    word_lengths = {}
-    with word_list_path.open(mode="r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            answer, clue = row["answer"], row["clue"]
-            nsanswer = answer.replace(" ","")
-            words = answer.split(" ")
-            for word in words:
-                if clue in word_lengths:
-                    word_lengths[clue].append(len(word))
-                else:
-                    word_lengths[clue] = [len(word)]
-            word_list.append([nsanswer, row["clue"]])
-    # Remove some words from the long word list at random
-    # This increases our chance of getting more shorter words in the crossword
-    word_list = list(filter(filter_word_randomly, word_list))
-
-    time = 10
-    print(f"Creating crossword... (takes {time} seconds)")
-    xword = Crossword(26, 26, "-", 5000, word_list)
-    xword.compute_crossword(time, spins=3)
-    xword_solution = xword.solution()
-    xword_grid = xword.display()
-    xword_legend = xword.legend()
-    print(f"Used {len(xword.current_word_list)} out of {len(word_list)} words")
-    print(f"Cycles: {xword.debug}")
-    print(xword_solution)
-
-    print("Making LaTeX table for crossword...")
-    ltx_xword_table = make_xword_ltxtable(xword_grid)
-    ltx_xword_clues = make_xword_clues(xword_legend, word_lengths)
-    print(f"Writing LaTeX document to {output_path}...")
-    with output_path.open(mode="w", encoding="utf-8") as f:
-        f.write(ltx_doc_start)
-        f.write(ltx_xword_table)
-        f.write(ltx_xword_clues)
-        f.write(ltx_doc_end)
-        for solution_ln in xword_solution.splitlines(keepends=True):
-            f.write(f"%  {solution_ln}")
-    print(f"Finished making crossword - run .\\make.py {output_path.name} to compile!")
+    try:
+        word_list, word_lengths = load_word_list(args.word_list, mapped=bool(args.sample))
+    except OSError as e:
+        parser.error(f"cannot read --word-list {args.word_list}: {e.strerror}")
+    except KeyError as e:
+        parser.error(f"--word-list {args.word_list} has no {e} column")
+    try:
+        check_pattern(word_list, search)
+    except OSError as e:
+        parser.error(f"cannot read --pattern {args.pattern}: {e.strerror}")
+    except ValueError as e:
+        parser.error(f"{f'--pattern {args.pattern}' if args.pattern else '--symmetric'}: {e}")
+    puzzle_store = None if args.no_puzzle_store else args.puzzle_store
+    if puzzle_store is not None:
+        from wordindex import file_hash
+        word_list_hash = file_hash(args.word_list)
+    else:
+        word_list_hash = None
+
+    if args.count is not None:
+        seeds = random.Random(seed).sample(range(2**32), args.count)
+        print(f"Creating {args.count} crosswords from seed {seed} in {args.out_dir}... "
+              f"(each takes up to {budget}, {args.workers} at a time)")
+        skipped, failed = 0, 0
+        for n, (puzzle_seed, output_path, summary) in enumerate(
+                make_batch(word_list, word_lengths, seeds, args.out_dir, search, workers=args.workers,
+                           outputs=outputs, store_path=puzzle_store, word_list_hash=word_list_hash,
+                           max_similarity=args.max_similarity), 1):
+            if summary["status"] == "duplicate":
+                print(f"[{n}/{args.count}] Skipped seed {puzzle_seed}: too like {summary['duplicate_of']}")
+                skipped += 1
+                continue
+            if summary["status"] == "failed":
+                print(f"[{n}/{args.count}] Failed seed {puzzle_seed}: could not fill the grid within the budget")
+                failed += 1
+                continue
+            cached = summary["status"] == "cached"
+            print(f"[{n}/{args.count}] Wrote {output_path.name} (seed {puzzle_seed}"
+                  f"{', from the puzzle store' if cached else ''}{', no search stats' if cached and args.stats else ''}): "
+                  f"used {summary['used']} out of {summary['available']} words in {summary['cycles']} cycles")
+        print(f"Finished making {args.count - skipped - failed} crosswords"
+              f"{f' ({skipped} skipped as duplicates)' if skipped else ''} - run make.py {args.out_dir} to compile them all!")
+        if failed:
+            sys.exit(f"Failed to make {failed} crossword(s)")
+        return
+
+    print(f"Creating crossword with seed {seed}... (takes up to {budget} on {args.workers} worker(s))")
+    if puzzle_store is not None:
+        from xwordstore import PuzzleStore
+        store = PuzzleStore(puzzle_store)
+    else:
+        store = None
+    output_path, result, summary = make_puzzle(word_list, word_lengths, seed, args.out_dir, search, outputs,
+                                               workers=args.workers, store=store, word_list_hash=word_list_hash)
+    if summary["status"] == "failed":
+        sys.exit(f"Could not fill the grid from {summary['available']} words within the budget; nothing written")
+    if summary["status"] == "cached":
+        print("Found the crossword in the puzzle store" + (", so no search ran to write stats for" if args.stats else ""))
+    print(f"Used {summary['used']} out of {summary['available']} words")
+    print(f"Cycles: {summary['cycles']}")
+    print(result.solution())
+    print(f"Wrote LaTeX document to {output_path}")
+    if args.json:
+        print(f"Wrote grid and words to {output_path.with_suffix('.json')}")
+    if args.stats and summary["status"] == "made":
+        print(f"Wrote search stats to {output_path.with_suffix('.stats.jsonl')}")
+    print(f"Finished making crossword - run make.py {output_path} to compile!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Compiled word lists: normalized answers and clues with length and letter indexes, cached on disk.
+
+Parsing the CSV word list and normalizing every answer is done once per version of the file; the compiled
+WordIndex is pickled to a cache keyed by the file's hash, so later loads only unpickle it.
+"""
+
+import csv
+import hashlib
+import os
+import pickle
+import re
+from pathlib import Path
+
+from xwordgen_bh import Word
+
+cache_version = 2
+
+
+class WordIndex(object):
+    """The answers and clues of a word list, indexed by answer length and by (length, position, letter).
+
+    Words are referred to by their id, their position in the word list. Answers are normalized as Word
+    normalizes them: lower case with the spaces taken out; lengths holds the lengths of the words of each
+    answer as written, e.g. [4, 3] for "red team".
+    """
+    def __init__(self, answers, clues, lengths):
+        self.answers = answers
+        self.clues = clues
+        self.lengths = lengths
+        self.by_length = {}
+        self.by_letter = {}
+        for i, answer in enumerate(answers):
+            self.by_length.setdefault(len(answer), []).append(i)
+            for position, letter in enumerate(answer):
+                self.by_letter.setdefault((len(answer), position, letter), []).append(i)
+
+    def __len__(self):
+        return len(self.answers)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Compile [answer, clue] pairs; multi-word answers are split on spaces for their lengths."""
+        answers, clues, lengths = [], [], []
+        for answer, clue in pairs:
+            answers.append(re.sub(r'\s', '', answer.lower()))
+            clues.append(clue)
+            lengths.append([len(word) for word in answer.split()])
+        return cls(answers, clues, lengths)
+
+    @classmethod
+    def from_csv(cls, path):
+        with Path(path).open(mode="r", encoding="utf-8") as f:
+            return cls.from_pairs((row["answer"], row["clue"]) for row in csv.DictReader(f))
+
+    def with_length(self, length):
+        return self.by_length.get(length, [])
+
+    def matching(self, length=None, position=None, letter=None):
+        """Ids of the words of the given length and/or with the given letter at the given position (from 0)."""
+        if position is None or letter is None:
+            return list(range(len(self))) if length is None else list(self.with_length(length))
+        if length is None:
+            return sorted(i for n in self.by_length for i in self.by_letter.get((n, position, letter), ()))
+        return list(self.by_letter.get((length, position, letter), ()))
+
+    def answer(self, i):
+        return self.answers[i]
+
+    def word(self, i):
+        return Word(self.answers[i], self.clues[i], id=i, normalized=True)
+
+    def words(self, ids=None):
+        """Fresh Word objects for the given ids, or for the whole word list."""
+        return [self.word(i) for i in (range(len(self)) if ids is None else ids)]
+
+    def word_lengths(self):
+        """The lengths of the words of each answer, keyed by clue."""
+        return dict(zip(self.clues, self.lengths))
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with Path(path).open(mode="rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_word_index(path, cache_dir=None):
+    """Load the WordIndex of a CSV word list, compiling it into cache_dir first if it has changed.
+
+    Without a cache_dir the word list is compiled on every call.
+    """
+    path = Path(path)
+    if cache_dir is None:
+        return WordIndex.from_csv(path)
+    cache_dir = Path(cache_dir)
+    cache_path = cache_dir / f"{path.stem}-{file_hash(path)[:16]}-v{cache_version}.pickle"
+    try:
+        with cache_path.open(mode="rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    index = WordIndex.from_csv(path)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open(mode="wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path.replace(cache_path) # so that concurrent loads never see a partial cache file
+    return index
@@ -0,0 +1,218 @@
+"""Memory-mapped word lists, for dictionaries too big to load whole.
+
+A WordStore keeps the answers and clues of a word list in one flat file, each in a blob with a table of offsets,
+along with the ids of the words of each length and of each (length, position, letter), and maps it into memory.
+Looking a word up, or the words matching a length and letter, touches only the pages that hold them, and the
+operating system shares and pages out the file as it likes, so a process only pays for what it reads. Words are
+made with their clues left in the file; a Word loads its clue the first time it is asked for it, which for a
+generated crossword means only the placed words.
+
+The store file is compiled from the CSV word list once per version of the file, into a cache keyed by the file's
+hash, as load_word_index does for WordIndex.
+"""
+
+import bisect
+import csv
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+
+from wordindex import file_hash
+from xwordgen_bh import Word
+
+store_version = 3
+magic = b"XWDS"
+# magic, version, byte order of the arrays, word count, then the offset and size of each section
+header = struct.Struct("<4sI8sI16Q")
+sections = ("answer_offsets", "answers", "clue_offsets", "clues", "length_offsets", "lengths", "index", "ids")
+
+# path -> the WordStore open on it in this process, so that words unpickled here share their store's loaded clues
+_open_stores = {}
+
+
+def open_word_store(path):
+    store = _open_stores.get(str(path))
+    return store if store is not None else WordStore(path)
+
+
+class ClueLengths(object):
+    """The lengths of the words of each answer keyed by clue, like WordIndex.word_lengths, for the clues loaded last."""
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, clue, default=None):
+        return self.store.loaded_lengths.get(clue, default)
+
+
+class WordStore(object):
+    """A compiled word list in a memory-mapped store file, with the lookups of WordIndex.
+
+    Words are referred to by their id, their position in the word list; answers are normalized as Word normalizes
+    them. The lists of ids returned are read-only views of the file. The lengths of the words of the answers of
+    the last max_loaded clues loaded are kept for word_lengths.
+    """
+    def __init__(self, path, max_loaded=4096):
+        self.path = Path(path)
+        with self.path.open(mode="rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = header.unpack_from(self.mm)
+        found_magic, version, byteorder, self.count = fields[:4]
+        if found_magic != magic or version != store_version or byteorder.rstrip(b"\0").decode() != sys.byteorder:
+            self.mm.close()
+            raise ValueError(f"{self.path} is not a word store of version {store_version} for this machine")
+        bounds = fields[4:]
+        view = memoryview(self.mm)
+        parts = {name: view[bounds[2 * n]:bounds[2 * n] + bounds[2 * n + 1]] for n, name in enumerate(sections)}
+        self.answer_offsets = parts["answer_offsets"].cast("I")
+        self.answers = parts["answers"]
+        self.clue_offsets = parts["clue_offsets"].cast("Q")
+        self.clues = parts["clues"]
+        self.length_offsets = parts["length_offsets"].cast("I")
+        self.lengths = parts["lengths"].cast("H")
+        self.ids = parts["ids"].cast("I")
+        # "length" or "length,position,letter" -> (start, stop) in ids; a few thousand keys at most
+        self.index = json.loads(bytes(parts["index"]))
+        self.answer_lengths = sorted(int(k) for k in self.index if "," not in k)
+        self.loaded_lengths = {} # clue -> lengths of the words of its answer, for the clues loaded last
+        self.max_loaded = max_loaded
+        _open_stores[str(self.path)] = self
+
+    def __reduce__(self): # other processes map the file themselves
+        return open_word_store, (self.path,)
+
+    def __len__(self):
+        return self.count
+
+    def answer(self, i):
+        return bytes(self.answers[self.answer_offsets[i]:self.answer_offsets[i + 1]]).decode("utf-8")
+
+    def clue(self, i):
+        clue = bytes(self.clues[self.clue_offsets[i]:self.clue_offsets[i + 1]]).decode("utf-8")
+        self.loaded_lengths.pop(clue, None) # so it is the last loaded again
+        self.loaded_lengths[clue] = list(self.lengths[self.length_offsets[i]:self.length_offsets[i + 1]])
+        if len(self.loaded_lengths) > self.max_loaded: # forget the clue loaded longest ago
+            del self.loaded_lengths[next(iter(self.loaded_lengths))]
+        return clue
+
+    def ids_for(self, key):
+        start, stop = self.index.get(key, (0, 0))
+        return self.ids[start:stop]
+
+    def with_length(self, length):
+        return self.ids_for(str(length))
+
+    def matching(self, length=None, position=None, letter=None):
+        """Ids of the words of the given length and/or with the given letter at the given position (from 0)."""
+        if position is None or letter is None:
+            return range(len(self)) if length is None else self.with_length(length)
+        if length is None:
+            return sorted(i for n in self.answer_lengths for i in self.ids_for(f"{n},{position},{letter}"))
+        return self.ids_for(f"{length},{position},{letter}")
+
+    def word(self, i): # the clue stays in the file until the word is asked for it
+        return Word(self.answer(i), None, id=i, normalized=True, source=self)
+
+    def words(self, ids=None):
+        """Fresh Word objects for the given ids, or for the whole word list."""
+        return [self.word(i) for i in (range(len(self)) if ids is None else ids)]
+
+    def sample(self, k, rng, min_length=2, max_length=None):
+        """k Word objects (or all, if fewer) chosen at random by rng among those of min_length to max_length letters.
+
+        Only the ids chosen are read, whatever the size of the store.
+        """
+        lengths = [n for n in self.answer_lengths if n >= min_length and (max_length is None or n <= max_length)]
+        buckets = [self.with_length(n) for n in lengths]
+        ends = []
+        total = 0
+        for bucket in buckets:
+            total += len(bucket)
+            ends.append(total)
+        chosen = []
+        for n in rng.sample(range(total), min(k, total)):
+            b = bisect.bisect_right(ends, n)
+            chosen.append(buckets[b][n - (ends[b - 1] if b else 0)])
+        return self.words(chosen)
+
+    def word_lengths(self):
+        """The lengths of the words of each answer, keyed by clue, for the clues loaded most recently."""
+        return ClueLengths(self)
+
+
+def write_word_store(pairs, path):
+    """Compile [answer, clue] pairs into a store file at path.
+
+    Answers and clues are streamed to the file as they come; only the offset tables and id lists are kept in
+    memory while compiling.
+    """
+    answer_offsets, clue_offsets, length_offsets = array("I", [0]), array("Q", [0]), array("I", [0])
+    keys = {} # index key -> array of ids
+    with tempfile.TemporaryFile() as answers, tempfile.TemporaryFile() as clues, \
+            tempfile.TemporaryFile() as lengths:
+        count = 0
+        for answer, clue in pairs:
+            normalized = re.sub(r"\s", "", answer.lower())
+            data = normalized.encode("utf-8")
+            answers.write(data)
+            answer_offsets.append(answer_offsets[-1] + len(data))
+            data = clue.encode("utf-8")
+            clues.write(data)
+            clue_offsets.append(clue_offsets[-1] + len(data))
+            data = array("H", (min(len(w), 0xFFFF) for w in answer.split())) # no grid holds a longer word
+            data.tofile(lengths)
+            length_offsets.append(length_offsets[-1] + len(data))
+            keys.setdefault(str(len(normalized)), array("I")).append(count)
+            for position, letter in enumerate(normalized):
+                keys.setdefault(f"{len(normalized)},{position},{letter}", array("I")).append(count)
+            count += 1
+        index, start = {}, 0
+        for key, ids in keys.items():
+            index[key] = (start, start + len(ids))
+            start += len(ids)
+        blobs = {"answer_offsets": answer_offsets, "answers": answers, "clue_offsets": clue_offsets,
+                 "clues": clues, "length_offsets": length_offsets, "lengths": lengths,
+                 "index": json.dumps(index).encode("utf-8"), "ids": keys.values()}
+        with Path(path).open(mode="wb") as f:
+            f.write(b"\0" * header.size)
+            bounds = []
+            for name in sections:
+                f.write(b"\0" * (-f.tell() % 8)) # keep the arrays aligned
+                start = f.tell()
+                blob = blobs[name]
+                if name == "ids":
+                    for ids in blob:
+                        ids.tofile(f)
+                elif isinstance(blob, array):
+                    blob.tofile(f)
+                elif isinstance(blob, bytes):
+                    f.write(blob)
+                else:
+                    blob.seek(0)
+                    for block in iter(lambda: blob.read(1 << 16), b""):
+                        f.write(block)
+                bounds += [start, f.tell() - start]
+            f.seek(0)
+            f.write(header.pack(magic, store_version, sys.byteorder.encode(), count, *bounds))
+
+
+def load_word_store(path, cache_dir=None):
+    """Open the WordStore of a CSV word list, compiling it into cache_dir (or next to it) first if it has changed."""
+    path = Path(path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else path.parent
+    store_path = cache_dir / f"{path.stem}-{file_hash(path)[:16]}-v{store_version}.words"
+    try:
+        return open_word_store(store_path)
+    except (OSError, ValueError, struct.error):
+        pass
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = store_path.with_suffix(f".{os.getpid()}.tmp")
+    with path.open(mode="r", encoding="utf-8") as f:
+        write_word_store(((row["answer"], row["clue"]) for row in csv.DictReader(f)), tmp_path)
+    tmp_path.replace(store_path) # so that concurrent loads never see a partial store file
+    return WordStore(store_path)
@@ -0,0 +1,75 @@
+"""Anytime crossword generation for asyncio applications.
+
+The search runs in a worker thread, off the event loop, and hands each improvement on the best crossword back to
+the loop as a CrosswordResult as soon as it is found. A client can show a first grid as soon as the first restart
+has placed a word, and take the best one so far whenever its latency budget runs out:
+
+    async with aclosing(iter_improvements(xword, 2.0)) as improvements:
+        async for result in improvements:
+            send_preview(result)
+
+    result = await best_within(xword, 0.25)
+
+The first restart reports its grid as it grows, the later ones each better grid they end with; backtracking also
+reports each better grid as it finds it. Leaving the loop early, or cancelling the task awaiting it, cancels the
+search at its next frontier cell or backtracking step.
+"""
+
+import asyncio
+import threading
+from contextlib import aclosing
+
+_done = object() # marks the end of the search on the queue
+
+
+async def iter_improvements(xword, time_permitted=None, executor=None, **options):
+    """Yield a CrosswordResult for each better grid xword.compute_crossword finds, until the search ends.
+
+    time_permitted is the deadline of the search in seconds; options (restarts, patience, strategy, ...) are
+    passed on to compute_crossword. The search runs in executor, or the loop's default thread pool. xword must
+    not be used elsewhere until the search has ended. Errors from the search are raised here.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancel = threading.Event()
+
+    def put(item): # from the search thread; once the loop is gone there is nobody left to tell
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            cancel.set()
+
+    def search():
+        try:
+            xword.compute_crossword(time_permitted, on_improve=lambda best: put(best.result()), cancel=cancel,
+                                    **options)
+        finally:
+            put(_done)
+
+    future = loop.run_in_executor(executor, search)
+    try:
+        while True:
+            result = await queue.get()
+            if result is _done:
+                break
+            yield result
+        await future
+    finally:
+        cancel.set()
+
+
+async def best_within(xword, time_permitted, executor=None, grace=0.05, **options):
+    """Return the CrosswordResult of the best grid found within time_permitted seconds, or None if there is none.
+
+    The search stops itself at the deadline and hands back the grid it was building; if that takes more than
+    grace seconds, the best result so far is returned at once and the search is cancelled.
+    """
+    best = None
+    try:
+        async with asyncio.timeout(time_permitted + grace):
+            async with aclosing(iter_improvements(xword, time_permitted, executor, **options)) as improvements:
+                async for best in improvements:
+                    pass
+    except TimeoutError:
+        pass
+    return best
@@ -1,7 +1,11 @@
 """Derived from http://bryanhelmig.com/python-crossword-puzzle-generator/ with adjustments for Python 3 compatability and case-specific usage.
 """
 
-import random, re, time, string
+import json, random, re, time, string
+from collections import deque
+from contextlib import nullcontext
+
+from xwordstats import SearchStats
 from copy import copy as duplicate
 
 # optional, speeds up by a factor of 4
@@ -9,107 +13,470 @@ from copy import copy as duplicate
 # psyco.full()
 
 class Crossword(object):
-    def __init__(self, cols, rows, empty = '-', maxloops = 2000, available_words=[]):
+    def __init__(self, cols, rows, empty = '-', maxloops = 2000, available_words=[], seed=None, stats=None):
         self.cols = cols
         self.rows = rows
         self.empty = empty
         self.maxloops = maxloops
         self.available_words = available_words
+        self.seed = seed
+        self.random = random.Random(seed) # all randomness goes through this, so a seed reproduces a search
         self.randomize_word_list()
         self.current_word_list = []
+        self.placed = set() # the words in current_word_list, for membership tests
         self.debug = 0
+        # the grid is a flat row-major bytearray, one byte per cell, cell (col, row) at (row-1)*cols + col-1
+        self.empty_byte = ord(empty)
+        self.blank_grid = bytes([self.empty_byte]) * (rows * cols)
+        # count of filled neighbours that stop a word running across/down through each empty cell
+        self.blank_across = bytes(rows * cols)
+        self.blank_down = bytes(rows * cols)
+        self.grid = bytearray(self.blank_grid)
+        self.blocked_across = bytearray(self.blank_across)
+        self.blocked_down = bytearray(self.blank_down)
+        # whether each cell is already in a word across/down, so no other word runs along it the same way
+        self.used_across = bytearray(self.blank_across)
+        self.used_down = bytearray(self.blank_down)
         self.clear_grid()
-
-    def clear_grid(self): # initialize grid and fill with empty character
-        self.grid = []
-        for i in range(self.rows):
-            ea_row = []
-            for j in range(self.cols):
-                ea_row.append(self.empty)
-            self.grid.append(ea_row)
+        self.stats = stats # a SearchStats to count into, see instrument
+        if stats is not None:
+            self.instrument(stats)
+
+    def instrument(self, stats): # shadow the hot methods of this crossword with versions counting into stats
+        suggest_coord, check_fit_score = self.suggest_coord, self.check_fit_score
+        fit_and_add, best_crossing = self.fit_and_add, self.best_crossing
+        set_word, unset_word = self.set_word, self.unset_word
+
+        def counted_suggest_coord(word):
+            coordlist = suggest_coord(word)
+            stats.count('suggest_coord')
+            stats.count('candidates', len(coordlist))
+            return coordlist
+
+        def counted_check_fit_score(col, row, vertical, word):
+            score = check_fit_score(col, row, vertical, word)
+            stats.count('check_fit_score')
+            if not score:
+                stats.count('reject_' + self.fit_rejection_reason(col, row, vertical, word))
+            return score
+
+        def counted_fit_and_add(word):
+            filled = fit_and_add(word)
+            stats.count('fit_and_add')
+            if filled is not None:
+                stats.count('fit_and_add_success')
+            return filled
+
+        def counted_best_crossing(col, row):
+            stats.count('frontier_cells')
+            return best_crossing(col, row)
+
+        def counted_set_word(col, row, vertical, word, force=False):
+            stats.count('words_placed')
+            return set_word(col, row, vertical, word, force)
+
+        def counted_unset_word(word, filled):
+            stats.count('words_removed')
+            return unset_word(word, filled)
+
+        self.suggest_coord, self.check_fit_score = counted_suggest_coord, counted_check_fit_score
+        self.fit_and_add, self.best_crossing = counted_fit_and_add, counted_best_crossing
+        self.set_word, self.unset_word = counted_set_word, counted_unset_word
+
+    def uninstrument(self): # back to the plain methods, e.g. so the crossword can be pickled
+        for name in ('suggest_coord', 'check_fit_score', 'fit_and_add', 'best_crossing', 'set_word', 'unset_word'):
+            self.__dict__.pop(name, None)
+
+    def clear_grid(self): # reset grid and masks in place, each with a single copy of its blank template
+        self.grid[:] = self.blank_grid
+        self.blocked_across[:] = self.blank_across
+        self.blocked_down[:] = self.blank_down
+        self.used_across[:] = self.blank_across
+        self.used_down[:] = self.blank_down
+        self.letter_cells = {} # letter -> set of (col, row) cells holding it, kept in step by set_word
+        self.changes = [] # positions filled by set_word, and ~positions emptied by unset_word, in order
+        self.candidates = {} # word -> (len(changes) when last scored, {placement: score} of fits), see candidate_scores
 
     def randomize_word_list(self): # also resets words and sorts by length
         temp_list = []
         for word in self.available_words:
             if isinstance(word, Word):
-                temp_list.append(Word(word.word, word.clue))
+                temp_list.append(word.fresh())
             else:
                 temp_list.append(Word(word[0], word[1]))
-        random.shuffle(temp_list) # randomize word list
+        self.random.shuffle(temp_list) # randomize word list
         temp_list.sort(key=lambda i: len(i.word), reverse=True) # sort by length
         self.available_words = temp_list
+        # letters outside latin-1 are stored in the grid as bytes no other letter uses, see grid_alphabet
+        if any(word.letters is None for word in temp_list):
+            self.to_grid, self.from_grid = grid_alphabet(temp_list, self.empty)
+            for word in temp_list:
+                word.letters = word.word.translate(self.to_grid).encode('latin-1')
+        else:
+            self.to_grid, self.from_grid = {}, {}
+        self.grid_letters = ''.join(map(chr, range(256))).translate(self.from_grid) # byte -> letter
+        # letter -> [(position, word)] in word list order, the words that can cross a cell holding the letter
+        self.words_by_letter = {}
+        for word in temp_list:
+            for position, letter in enumerate(word.word):
+                self.words_by_letter.setdefault(letter, []).append((position, word))
 
-    def compute_crossword(self, time_permitted = 1.00, spins=2):
-        time_permitted = float(time_permitted)
+    def compute_crossword(self, time_permitted = 1.00, spins=2, workers=1, restarts=None,
+                          target_words=None, target_density=None, patience=None,
+                          strategy='greedy', depth=4, branching=2, on_improve=None, cancel=None):
+        '''
+        Search for the crossword with the most placed words by randomized restarts.
 
-        count = 0
-        copy = Crossword(self.cols, self.rows, self.empty, self.maxloops, self.available_words)
-
-        start_full = float(time.time())
-        while (float(time.time()) - start_full) < time_permitted or count == 0: # only run for x seconds
-            self.debug += 1
-            copy.current_word_list = []
-            copy.clear_grid()
-            copy.randomize_word_list()
-            x = 0
-            while x < spins: # spins; 2 seems to be plenty
-                for word in copy.available_words:
-                    if word not in copy.current_word_list:
-                        copy.fit_and_add(word)
-                x += 1
+        The greedy strategy adds the best word crossing each open letter on the grid, see frontier_fill.
+        The backtrack strategy runs a depth-limited search per restart instead, see backtrack_fill.
+
+        Stops after time_permitted seconds, cutting the last restart short, or after the given number of restarts
+        (per worker), whichever comes first; either may be None. Only a restart budget makes the result reproducible from the seed.
+
+        Stops early once every available word is placed, once the best grid holds target_words words or
+        fills target_density of its cells, or once patience restarts in a row have not improved on it.
+
+        on_improve is called with this crossword each time it takes a better grid, from the thread running the
+        search, so the best grid so far can be shown or kept while the search goes on; until the first greedy
+        restart has finished, also with the grid it is growing, at most every 50 ms. cancel, e.g. a
+        threading.Event, stops the search at the next frontier cell, or backtracking step, once it is set. With
+        workers > 1, on_improve is called as the workers finish and cancel is not checked. See xwordasync.
+        '''
+        if time_permitted is None and restarts is None and patience is None:
+            raise ValueError('compute_crossword needs a time_permitted, restarts or patience budget')
+        if strategy not in ('greedy', 'backtrack'):
+            raise ValueError(f"unknown strategy '{strategy}', expected 'greedy' or 'backtrack'")
+        if time_permitted is not None:
+            time_permitted = float(time_permitted)
+        options = dict(restarts=restarts, target_words=target_words, target_density=target_density, patience=patience,
+                       strategy=strategy, depth=depth, branching=branching)
+        if workers > 1:
+            return self.compute_crossword_parallel(time_permitted, spins, workers, on_improve=on_improve, **options)
+
+        start_full = float(time.time()) # before setting up, which takes a while on long word lists
+        deadline = start_full + time_permitted if time_permitted is not None else None
+        count, stale = 0, 0
+        stats = self.stats
+        phase = stats.phase if stats is not None else nullcontext
+        copy = Crossword(self.cols, self.rows, self.empty, self.maxloops, self.available_words,
+                         seed=self.random.getrandbits(64), stats=stats)
+
+        while True:
+            best = len(self.current_word_list)
+            with phase('reset'):
+                copy.current_word_list = []
+                copy.placed = set()
+                copy.clear_grid()
+                copy.randomize_word_list()
+            with phase('fill'):
+                if strategy == 'backtrack':
+                    copy.backtrack_fill(self, depth, branching, deadline, cancel, on_improve, spins)
+                else:
+                    self.debug += 1
+                    # until one restart has finished, report the grid it grows, for a first grid at once
+                    on_grow = self.grow_reporter(on_improve) if on_improve is not None and not best else None
+                    copy.frontier_fill(spins, deadline, cancel, on_grow)
             #print copy.solution()
             #print len(copy.current_word_list), len(self.current_word_list), self.debug
             # buffer the best crossword by comparing placed words
             if len(copy.current_word_list) > len(self.current_word_list):
-                self.current_word_list = copy.current_word_list
-                self.grid = copy.grid
+                self.take_grid(copy)
+            if len(self.current_word_list) > best:
+                stale = 0
+            else:
+                stale += 1
             count += 1
+            if stats is not None:
+                stats.count('restarts')
+                if not stale:
+                    stats.record_best(len(self.current_word_list), self.density())
+            if on_improve is not None and not stale and strategy != 'backtrack': # backtrack_fill reports its own
+                on_improve(self)
+
+            if self.reached_target(target_words, target_density):
+                break
+            if patience is not None and stale >= patience: # plateaued
+                break
+            if time_permitted is not None and (float(time.time()) - start_full) >= time_permitted: # only run for x seconds
+                break
+            if restarts is not None and count >= restarts: # or x restarts
+                break
+            if cancel is not None and cancel.is_set():
+                break
+        return
+
+    def grow_reporter(self, on_improve, interval=0.05): # an on_grow for frontier_fill taking and reporting the grid
+        last = None # time of the last report; the first is made at once, the rest at most every interval seconds
+
+        def on_grow(growing):
+            nonlocal last
+            now = time.time()
+            if last is None or now - last >= interval:
+                last = now
+                self.take_grid(growing)
+                on_improve(self)
+        return on_grow
+
+    def reached_target(self, target_words=None, target_density=None): # is the best grid good enough to stop searching
+        placed = len(self.current_word_list)
+        if placed == len(self.available_words):
+            return True
+        if target_words is not None and placed >= target_words:
+            return True
+        if target_density is not None and self.density() >= target_density:
+            return True
+        return False
+
+    def density(self): # fraction of the grid's cells holding a letter
+        return 1 - self.grid.count(self.empty_byte) / len(self.grid)
+
+    def compute_crossword_parallel(self, time_permitted, spins, workers, on_improve=None, **options): # independent restart loops, one per process
+        seeds = [self.random.getrandbits(64) for i in range(workers)] # each worker gets its own derived seed
+        jobs = [(self.cols, self.rows, self.empty, self.maxloops, self.available_words, seed, time_permitted, spins, options,
+                 self.stats is not None)
+                for seed in seeds]
+        from concurrent.futures import ProcessPoolExecutor # only parallel searches pay for the import
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(_compute_worker, jobs):
+                self.debug += result.debug
+                if self.stats is not None:
+                    self.stats.merge(result.stats)
+                # keep the grid with the most placed words, as the single process loop does
+                if len(result.current_word_list) > len(self.current_word_list):
+                    self.take_grid(result)
+                    if on_improve is not None:
+                        on_improve(self)
         return
 
+    def take_grid(self, other): # snapshot the placed words, grid and its indexes from another crossword
+        self.current_word_list = [duplicate(word) for word in other.current_word_list] # words move again when backtracking
+        self.placed = set(self.current_word_list)
+        self.grid = bytearray(other.grid)
+        self.letter_cells = {letter: set(cells) for letter, cells in other.letter_cells.items()}
+        self.blocked_across, self.blocked_down = bytearray(other.blocked_across), bytearray(other.blocked_down)
+        self.used_across, self.used_down = bytearray(other.used_across), bytearray(other.used_down)
+        self.changes, self.candidates = [], {}
+
+    def seed_grid(self): # place the first word that fits on the empty grid, return (word, filled cells) or None
+        for word in self.available_words:
+            filled = self.fit_and_add(word)
+            if filled is not None:
+                return word, filled
+        return None
+
+    def frontier_fill(self, spins, deadline=None, cancel=None, on_grow=None):
+        '''
+        Greedily fill the grid from its frontier: the letters on the grid with free space on both sides across or down.
+
+        Seeds the grid with the first word that fits, then works through a queue of frontier cells, adding the best scoring
+        word that crosses each one, longest first among equals, and queueing the cells of every word added. Each
+        spin starts a new pass over the whole frontier; spins stop early once a pass adds nothing. A cell no word
+        crosses is not scored again: filling cells never turns a score of 0 into a fit. Stops at the next cell once
+        the deadline (a time.time()) has passed or cancel is set, leaving the words added so far. on_grow is called
+        with this crossword after the seed word and each word added. Returns [(word, filled cells)] of the words
+        added, in order, for unset_word.
+        '''
+        placed = []
+        if not self.current_word_list:
+            seed = self.seed_grid()
+            if seed is not None:
+                placed.append(seed)
+                if on_grow is not None:
+                    on_grow(self)
+        dead = set() # cells no word could cross; only adding words, they can never be crossed again
+        x = 0
+        while x < spins: # spins; 2 seems to be plenty
+            added = False
+            pending = deque(cell for cells in self.letter_cells.values() for cell in cells)
+            while pending:
+                cell = pending.popleft()
+                if cell in dead:
+                    continue
+                if (deadline is not None and time.time() >= deadline) or (cancel is not None and cancel.is_set()):
+                    return placed
+                best = self.best_crossing(*cell)
+                if best is None:
+                    dead.add(cell)
+                else:
+                    score, word, col, row, vertical = best
+                    filled = self.set_word(col, row, vertical, word, force=True)
+                    placed.append((word, filled))
+                    pending.extend((pos % self.cols + 1, pos // self.cols + 1) for pos in filled)
+                    added = True
+                    if on_grow is not None:
+                        on_grow(self)
+            if not added:
+                break
+            x += 1
+        return placed
+
+    def best_crossing(self, col, row):
+        '''
+        Return (score, word, col, row, vertical) for the best scoring unplaced word crossing the cell, or None.
+
+        Only the words with the cell's letter are scored, and only in a direction with no letter on either side of
+        the cell. Ties go to the word first in the word list.
+        '''
+        cols, rows, grid, empty = self.cols, self.rows, self.grid, self.empty_byte
+        pos = (row - 1) * cols + col - 1
+        down = (row == 1 or grid[pos-cols] == empty) and (row == rows or grid[pos+cols] == empty)
+        across = (col == 1 or grid[pos-1] == empty) and (col == cols or grid[pos+1] == empty)
+        if not (down or across):
+            return None
+        best = None
+        for position, word in self.words_by_letter.get(self.grid_letters[grid[pos]], ()):
+            if word in self.placed:
+                continue
+            if down and 0 < row - position and row - position + word.length - 1 <= rows:
+                score = self.check_fit_score(col, row - position, 1, word)
+                if score and (best is None or score > best[0]):
+                    best = (score, word, col, row - position, 1)
+            if across and 0 < col - position and col - position + word.length - 1 <= cols:
+                score = self.check_fit_score(col - position, row, 0, word)
+                if score and (best is None or score > best[0]):
+                    best = (score, word, col - position, row, 0)
+        return best
+
+    def backtrack_fill(self, best, depth, branching, deadline=None, cancel=None, on_improve=None, spins=2):
+        '''
+        Fill the grid by depth-limited backtracking, recording every improvement on best with best.take_grid.
+
+        Seeds the grid with the longest word that fits, then at each level leaves out the most constrained word, the one
+        with the fewest fitting coordinates, or places it at each of its top scoring coordinates in turn. Forward
+        checking prunes a branch once the words that can still cross the grid could not beat best. Below depth
+        levels the rest is filled by frontier_fill with spins, so the first leaf is the greedy fill of the restart.
+        Each node expansion is counted in best.debug, and each improvement on best is passed to on_improve. Stops at
+        the deadline, a time.time(), or once cancel is set.
+        '''
+        seed = self.seed_grid()
+        if seed is None:
+            return
+        self.backtrack(best, [word for word in self.available_words if word is not seed[0]], depth, branching, deadline,
+                       cancel, on_improve, spins)
+        self.unset_word(*seed)
+
+    def backtrack(self, best, remaining, depth, branching, deadline, cancel=None, on_improve=None, spins=2):
+        best.debug += 1
+        if len(self.current_word_list) > len(best.current_word_list):
+            best.take_grid(self)
+            if on_improve is not None:
+                on_improve(best)
+        if deadline is not None and time.time() >= deadline:
+            return
+        if cancel is not None and cancel.is_set():
+            return
+
+        if depth == 0: # beyond the depth limit, fill the rest greedily from the frontier and then take it off again
+            placed = self.frontier_fill(spins, deadline, cancel)
+            if len(self.current_word_list) > len(best.current_word_list):
+                best.take_grid(self)
+                if on_improve is not None:
+                    on_improve(best)
+            for word, filled in reversed(placed):
+                self.unset_word(word, filled)
+            return
+
+        # forward check: only words that still cross the grid somewhere can be added below this node
+        live = []
+        for word in remaining:
+            coordlist = self.suggest_coord(word)
+            if coordlist:
+                live.append((word, coordlist))
+        if len(self.current_word_list) + len(live) <= len(best.current_word_list):
+            return
+
+        word, coordlist = min(live, key=lambda i: len(i[1])) # most constrained word first
+        rest = [w for w, c in live if w is not word]
+        saved = {w: self.candidates[w][1] for w in rest} # scored on the grid as it is at this node
+        # first the branch where the word is left out, so the first leaf of a restart is the greedy fill
+        if len(self.current_word_list) + len(rest) > len(best.current_word_list):
+            self.backtrack(best, rest, depth - 1, branching, deadline, cancel, on_improve, spins)
+            self.restore_candidates(saved) # the grid is back as it was, so are the scores
+        for col, row, vertical, colrow, score in coordlist[:branching]:
+            filled = self.set_word(col, row, vertical, word, force=True)
+            self.backtrack(best, rest, depth - 1, branching, deadline, cancel, on_improve, spins)
+            self.unset_word(word, filled)
+            self.restore_candidates(saved)
+
     def suggest_coord(self, word):
-        count = 0
-        coordlist = []
-        glc = -1
-        for given_letter in word.word: # cycle through letters in word
-            glc += 1
-            rowc = 0
-            for row in self.grid: # cycle through rows
-                rowc += 1
-                colc = 0
-                for cell in row: # cycle through  letters in rows
-                    colc += 1
-                    if given_letter == cell: # check match letter in word to letters in row
-                        try: # suggest vertical placement
-                            if rowc - glc > 0: # make sure we're not suggesting a starting point off the grid
-                                if ((rowc - glc) + word.length) <= self.rows: # make sure word doesn't go off of grid
-                                    coordlist.append([colc, rowc - glc, 1, colc + (rowc - glc), 0])
-                        except: pass
-                        try: # suggest horizontal placement
-                            if colc - glc > 0: # make sure we're not suggesting a starting point off the grid
-                                if ((colc - glc) + word.length) <= self.cols: # make sure word doesn't go off of grid
-                                    coordlist.append([colc - glc, rowc, 0, rowc + (colc - glc), 0])
-                        except: pass
         # example: coordlist[0] = [col, row, vertical, col + row, score]
-        #print word.word
-        #print coordlist
-        new_coordlist = self.sort_coordlist(coordlist, word)
-        #print new_coordlist
-        return new_coordlist
-
-    def sort_coordlist(self, coordlist, word): # give each coordinate a score, then sort
-        new_coordlist = []
-        for coord in coordlist:
-            col, row, vertical = coord[0], coord[1], coord[2]
-            coord[4] = self.check_fit_score(col, row, vertical, word) # checking scores
-            if coord[4]: # 0 scores are filtered
-                new_coordlist.append(coord)
-        random.shuffle(new_coordlist) # randomize coord list; why not?
-        new_coordlist.sort(key=lambda i: i[4], reverse=True) # put the best scores first
-        return new_coordlist
+        coordlist = [[col, row, vertical, col + row, score]
+                     for (col, row, vertical), score in self.candidate_scores(word).items()]
+        return self.sort_coordlist(coordlist)
+
+    def candidate_scores(self, word):
+        '''
+        Return {(col, row, vertical): score} for the fitting placements of the word that cross a letter on the grid.
+
+        The scores are cached per word, see restore_candidates, and brought up to date from the cells set_word
+        filled since: only placements whose cells, or the cells around them, include a filled cell are scored
+        again, and placements crossing a filled cell are added. Filling cells never turns a score of 0 into a
+        fit, so placements that stop fitting are dropped. Once unset_word has emptied cells since, the word's
+        placements are found and scored afresh. The dict returned must not be changed.
+        '''
+        cols, rows, grid = self.cols, self.rows, self.grid
+        changes, length, letters = self.changes, word.length, word.letters
+        cached = self.candidates.get(word)
+        if cached is not None and cached[0] == len(changes):
+            return cached[1]
+        if cached is None or min(changes[cached[0]:]) < 0: # new, or cells were emptied: start over
+            scores = {}
+            cells = [(position, cell) for position, letter in enumerate(word.word)
+                     for cell in self.letter_cells.get(letter, ())]
+        else:
+            changed = changes[cached[0]:]
+            positions = {} # letter -> its positions in the word
+            for position, letter in enumerate(letters):
+                positions.setdefault(letter, []).append(position)
+            # the placements crossing the filled cells, and the bounding box of the filled cells
+            cells = []
+            left, right = cols, 0
+            for pos in changed:
+                rowc, colc = divmod(pos, cols)
+                left, right = min(left, colc), max(right, colc)
+                for position in positions.get(grid[pos], ()):
+                    cells.append((position, (colc + 1, rowc + 1)))
+            top, bottom, left, right = min(changed) // cols + 1, max(changed) // cols + 1, left + 1, right + 1
+            scores = {} # a new dict, the cached one may be held on to by restore_candidates
+            for key, score in cached[1].items():
+                col, row, vertical = key
+                if vertical:
+                    hit = col - 1 <= right and col + 1 >= left and row - 1 <= bottom and row + length >= top
+                else:
+                    hit = row - 1 <= bottom and row + 1 >= top and col - 1 <= right and col + length >= left
+                if hit:
+                    score = self.check_fit_score(col, row, vertical, word)
+                if score:
+                    scores[key] = score
+        check_fit_score = self.check_fit_score
+        for position, (colc, rowc) in cells: # the placements crossing each cell at the given position in the word
+            row, col = rowc - position, colc - position
+            if 0 < row and row + length - 1 <= rows and (colc, row, 1) not in scores:
+                score = check_fit_score(colc, row, 1, word)
+                if score:
+                    scores[colc, row, 1] = score
+            if 0 < col and col + length - 1 <= cols and (col, rowc, 0) not in scores:
+                score = check_fit_score(col, rowc, 0, word)
+                if score:
+                    scores[col, rowc, 0] = score
+        self.candidates[word] = (len(changes), scores)
+        return scores
+
+    def restore_candidates(self, saved): # put back the cached scores of {word: scores} taken on the grid as it is now
+        synced = len(self.changes)
+        for word, scores in saved.items():
+            self.candidates[word] = (synced, scores)
+
+    def sort_coordlist(self, coordlist): # sort scored coordinates, best first
+        self.random.shuffle(coordlist) # randomize coord list; why not?
+        coordlist.sort(key=lambda i: i[4], reverse=True) # put the best scores first
+        return coordlist
 
     def fit_and_add(self, word): # doesn't really check fit except for the first word; otherwise just adds if score is good
         fit = False
+        filled = None # cells filled by the word, returned if it was added
         count = 0
+        tried = set() # seed orientations tried
         coordlist = self.suggest_coord(word)
 
         while not fit and count < self.maxloops:
@@ -118,7 +485,7 @@ class Crossword(object):
                 # # top left seed of longest word yields best results (maybe override)
                 # vertical, col, row = random.randrange(0, 2), 1, 1
                 # optional center seed method, slower and less keyword placement
-                vertical = random.randrange(0, 2)
+                vertical = self.random.randrange(0, 2)
                 if vertical:
                     col = int(round((self.cols + 1)/2, 0))
                     row = int(round((self.rows + 1)/2, 0)) - int(round((word.length + 1)/2, 0))
@@ -130,9 +497,11 @@ class Crossword(object):
                 # row = random.randrange(1, self.rows + 1)
 
 
+                tried.add(vertical)
                 if self.check_fit_score(col, row, vertical, word):
                     fit = True
-                    self.set_word(col, row, vertical, word, force=True)
+                    filled = self.set_word(col, row, vertical, word, force=True)
+                elif len(tried) == 2: return # fits neither way at the centre
             else: # a subsquent words have scores calculated
                 try:
                     col, row, vertical = coordlist[count][0], coordlist[count][1], coordlist[count][2]
@@ -140,126 +509,157 @@ class Crossword(object):
 
                 if coordlist[count][4]: # already filtered these out, but double check
                     fit = True
-                    self.set_word(col, row, vertical, word, force=True)
+                    filled = self.set_word(col, row, vertical, word, force=True)
 
             count += 1
-        return
+        return filled
 
     def check_fit_score(self, col, row, vertical, word):
         '''
         And return score (0 signifies no fit). 1 means a fit, 2+ means a cross.
 
-        The more crosses the better.
+        The more crosses the better. The word's cells and the blocked_across/blocked_down and used_across/used_down
+        masks kept by set_word are taken as strided slices of the flat grid, so no neighbours are probed. A cross
+        point must cross: a letter already in a word running the same way would lay this word over it.
         '''
         if col < 1 or row < 1:
             return 0
 
-        count, score = 1, 1 # give score a standard value of 1, will override with 0 if collisions detected
-        for letter in word.word:
-            try:
-                active_cell = self.get_cell(col, row)
-            except IndexError:
+        cols, length, empty = self.cols, word.length, self.empty_byte
+        grid = self.grid
+        if vertical:
+            if col > cols or row + length - 1 > self.rows:
                 return 0
-
-            if active_cell == self.empty or active_cell == letter:
-                pass
-            else:
+            start, step = (row - 1) * cols + col - 1, cols
+            blocked, used = self.blocked_down, self.used_down
+        else: # else horizontal
+            if row > self.rows or col + length - 1 > cols:
                 return 0
+            start, step = (row - 1) * cols + col - 1, 1
+            blocked, used = self.blocked_across, self.used_across
+        end = start + length * step
 
-            if active_cell == letter:
-                score += 1
-
-            if vertical:
-                # check surroundings
-                if active_cell != letter: # don't check surroundings if cross point
-                    if not self.check_if_cell_clear(col+1, row): # check right cell
-                        return 0
-
-                    if not self.check_if_cell_clear(col-1, row): # check left cell
-                        return 0
-
-                if count == 1: # check top cell only on first letter
-                    if not self.check_if_cell_clear(col, row-1):
-                        return 0
-
-                if count == len(word.word): # check bottom cell only on last letter
-                    if not self.check_if_cell_clear(col, row+1):
-                        return 0
-            else: # else horizontal
-                # check surroundings
-                if active_cell != letter: # don't check surroundings if cross point
-                    if not self.check_if_cell_clear(col, row-1): # check top cell
-                        return 0
-
-                    if not self.check_if_cell_clear(col, row+1): # check bottom cell
-                        return 0
-
-                if count == 1: # check left cell only on first letter
-                    if not self.check_if_cell_clear(col-1, row):
-                        return 0
-
-                if count == len(word.word): # check right cell only on last letter
-                    if not self.check_if_cell_clear(col+1, row):
-                        return 0
-
-
-            if vertical: # progress to next letter and position
-                row += 1
-            else: # else horizontal
-                col += 1
+        if (row > 1 if vertical else col > 1) and grid[start - step] != empty: # check top/left cell
+            return 0
+        if (row + length - 1 < self.rows if vertical else col + length - 1 < cols) and grid[end] != empty: # check bottom/right cell
+            return 0
 
-            count += 1
+        score = 1 # give score a standard value of 1, will override with 0 if collisions detected
+        for letter, active_cell, blocked_cell in zip(word.letters, grid[start:end:step], blocked[start:end:step]):
+            if active_cell == letter: # cross point, surroundings are not checked
+                score += 1
+            elif active_cell != empty or blocked_cell: # collision or a neighbour alongside
+                return 0
+        if score > 1 and any(used[start:end:step]): # a cross point already in a word running this way
+            return 0
 
         return score
 
-    def set_word(self, col, row, vertical, word, force=False): # also adds word to word list
+    def fit_rejection_reason(self, col, row, vertical, word): # why check_fit_score gives 0, or None if it doesn't
+        cols, rows, length, empty = self.cols, self.rows, word.length, self.empty_byte
+        if col < 1 or row < 1 or (vertical and (col > cols or row + length - 1 > rows)) \
+                or (not vertical and (row > rows or col + length - 1 > cols)):
+            return 'off_grid'
+        pos, step = (row - 1) * cols + col - 1, cols if vertical else 1
+        if (row > 1 if vertical else col > 1) and self.grid[pos - step] != empty:
+            return 'ends'
+        if (row + length - 1 < rows if vertical else col + length - 1 < cols) and self.grid[pos + length * step] != empty:
+            return 'ends'
+        blocked = self.blocked_down if vertical else self.blocked_across
+        used = self.used_down if vertical else self.used_across
+        for letter in word.letters:
+            if self.grid[pos] == letter and used[pos]:
+                return 'overlap'
+            if self.grid[pos] != letter:
+                if self.grid[pos] != empty:
+                    return 'collision'
+                if blocked[pos]:
+                    return 'adjacent'
+            pos += step
+        return None
+
+    def set_word(self, col, row, vertical, word, force=False): # also adds word to word list, returns the cells it filled
+        filled = []
         if force:
             word.col = col
             word.row = row
             word.vertical = vertical
             self.current_word_list.append(word)
-
-            for letter in word.word:
-                self.set_cell(col, row, letter)
+            self.placed.add(word)
+
+            pos, step = (row - 1) * self.cols + col - 1, self.cols if vertical else 1
+            used = self.used_down if vertical else self.used_across
+            for letter, byte in zip(word.word, word.letters):
+                used[pos] = 1
+                if self.grid[pos] == self.empty_byte: # cross points already have their neighbours counted
+                    self.block_neighbours(pos)
+                    self.grid[pos] = byte
+                    self.letter_cells.setdefault(letter, set()).add((col, row))
+                    filled.append(pos)
+                pos += step
                 if vertical:
                     row += 1
                 else:
                     col += 1
-        return
+            self.changes.extend(filled)
+        return filled
+
+    def unset_word(self, word, filled): # take back the last word set, given the cells set_word filled for it
+        self.current_word_list.remove(word)
+        self.placed.discard(word)
+        start, step = (word.row - 1) * self.cols + word.col - 1, self.cols if word.vertical else 1
+        used = self.used_down if word.vertical else self.used_across
+        used[start:start + word.length * step:step] = bytes(word.length)
+        for pos in filled:
+            row, col = divmod(pos, self.cols)
+            self.letter_cells[self.grid_letters[self.grid[pos]]].discard((col + 1, row + 1))
+            self.grid[pos] = self.empty_byte
+            self.block_neighbours(pos, -1)
+        self.changes.extend(~pos for pos in filled)
+
+    def block_neighbours(self, pos, count=1): # count a newly filled (or emptied, count -1) cell against the masks around it
+        cols = self.cols
+        if pos >= cols:
+            self.blocked_across[pos-cols] += count
+        if pos + cols < len(self.grid):
+            self.blocked_across[pos+cols] += count
+        if pos % cols > 0:
+            self.blocked_down[pos-1] += count
+        if pos % cols + 1 < cols:
+            self.blocked_down[pos+1] += count
 
     def set_cell(self, col, row, value):
-        self.grid[row-1][col-1] = value
+        self.grid[self.cell_index(col, row)] = ord(value.translate(self.to_grid))
 
     def get_cell(self, col, row):
-        return self.grid[row-1][col-1]
+        return self.grid_letters[self.grid[self.cell_index(col, row)]]
+
+    def cell_index(self, col, row): # position of a cell in the flat grid
+        if not (1 <= col <= self.cols and 1 <= row <= self.rows):
+            raise IndexError(f'cell ({col},{row}) is off the grid')
+        return (row - 1) * self.cols + col - 1
+
+    def grid_rows(self): # the grid as a list of rows of one-character strings
+        cells = self.grid.decode('latin-1').translate(self.from_grid)
+        return [cells[r * self.cols:(r + 1) * self.cols] for r in range(self.rows)]
 
-    def check_if_cell_clear(self, col, row):
+    def check_if_cell_clear(self, col, row): # cells off the grid count as clear
         try:
-            cell = self.get_cell(col, row)
-            if cell == self.empty:
-                return True
+            return self.get_cell(col, row) == self.empty
         except IndexError:
-            pass
-        return False
+            return True
 
     def solution(self): # return solution grid
-        outStr = ""
-        for r in range(self.rows):
-            for c in self.grid[r]:
-                outStr += '%s ' % c
-            outStr += '\n'
-        return outStr
+        return ''.join(self.solution_lines())
+
+    def solution_lines(self): # yield the solution grid line by line
+        for row in self.grid_rows():
+            yield ' '.join(row) + ' \n'
 
     def word_find(self): # return solution grid
-        outStr = ""
-        for r in range(self.rows):
-            for c in self.grid[r]:
-                if c == self.empty:
-                    outStr += '%s ' % string.ascii_lowercase[random.randint(0,len(string.ascii_lowercase)-1)]
-                else:
-                    outStr += '%s ' % c
-            outStr += '\n'
-        return outStr
+        letters = string.ascii_lowercase
+        return ''.join(' '.join(letters[self.random.randint(0, len(letters)-1)] if c == self.empty else c for c in row) + ' \n'
+                       for row in self.grid_rows())
 
     def order_number_words(self): # orders words and applies numbering system to them
         self.current_word_list.sort(key=lambda i: (i.col + i.row))
@@ -274,41 +674,65 @@ class Crossword(object):
             icount += 1
 
     def display(self, order=True): # return (and order/number wordlist) the grid minus the words adding the numbers
-        outStr = ""
         if order:
             self.order_number_words()
 
-        copy = self
-
-        for word in self.current_word_list:
-            copy.set_cell(word.col, word.row, word.number)
-
-        for r in range(copy.rows):
-            for c in copy.grid[r]:
-                outStr += '%s ' % c
-            outStr += '\n'
+        numbers = {(word.col, word.row): word.number for word in self.current_word_list}
+        outStr = ''.join(' '.join(str(numbers.get((c, r), cell)) for c, cell in enumerate(row, 1)) + ' \n'
+                         for r, row in enumerate(self.grid_rows(), 1))
 
         outStr = re.sub(r'[a-z]', 'w', outStr)
         return outStr
 
+    def result(self, seed=None): # return (and order/number wordlist) the crossword as a CrosswordResult
+        # seed is the one to record as having made it, e.g. that of the request; by default this crossword's own
+        self.order_number_words()
+        words = [WordRecord(word.number, word.col, word.row, word.down_across(), word.word, word.clue)
+                 for word in self.current_word_list]
+        return CrosswordResult(self.cols, self.rows, self.empty, self.grid_rows(), words,
+                               self.seed if seed is None else seed)
+
     def word_bank(self):
-        outStr = ''
         temp_list = duplicate(self.current_word_list)
-        random.shuffle(temp_list) # randomize word list
-        for word in temp_list:
-            outStr += '%s\n' % word.word
-        return outStr
+        self.random.shuffle(temp_list) # randomize word list
+        return ''.join('%s\n' % word.word for word in temp_list)
 
     def legend(self): # must order first
-        outStr = ''
-        for word in self.current_word_list:
-            outStr += '%d. (%d,%d) %s %s: %s\n' % (word.number, word.col, word.row, word.down_across(), len(word.word), word.clue)
-        return outStr
+        return ''.join('%d. (%d,%d) %s %s: %s\n' % (word.number, word.col, word.row, word.down_across(), len(word.word), word.clue)
+                       for word in self.current_word_list)
+
+def grid_alphabet(words, empty):
+    '''
+    Give the letters of the words outside latin-1 bytes of their own to be stored in the grid as.
+
+    Latin-1 letters are stored as their own byte; the others take, in order, the bytes that neither those nor empty
+    take. Returns str.translate tables from the letters to the bytes, as characters, and back.
+    '''
+    letters = sorted(set(empty).union(*(word.word for word in words)))
+    taken = {ord(letter) for letter in letters if ord(letter) < 256}
+    free = (byte for byte in range(256) if byte not in taken)
+    to_grid = {}
+    for letter in letters:
+        if ord(letter) >= 256:
+            byte = next(free, None)
+            if byte is None:
+                raise ValueError('the word list has more than 256 different letters to store in the grid')
+            to_grid[ord(letter)] = chr(byte)
+    return to_grid, {ord(byte): chr(letter) for letter, byte in to_grid.items()}
 
 class Word(object):
-    def __init__(self, word=None, clue=None):
-        self.word = re.sub(r'\s', '', word.lower())
-        self.clue = clue
+    # slots, as there may be thousands of words to a search; source is a word store to load the clue from
+    __slots__ = ('word', 'id', 'letters', '_clue', 'source', 'length', 'row', 'col', 'vertical', 'number')
+
+    def __init__(self, word=None, clue=None, id=None, normalized=False, source=None):
+        self.word = word if normalized else re.sub(r'\s', '', word.lower())
+        self.id = id # position in the word list or index it came from, if any
+        try:
+            self.letters = self.word.encode('latin-1') # one byte per letter, as stored in the grid
+        except UnicodeEncodeError: # given bytes by the crossword it is placed in, see grid_alphabet
+            self.letters = None
+        self._clue = clue
+        self.source = source
         self.length = len(self.word)
         # the below are set when placed on board
         self.row = None
@@ -316,6 +740,19 @@ class Word(object):
         self.vertical = None
         self.number = None
 
+    @property
+    def clue(self): # loaded from the source on first use, so only the placed words of a big word list need theirs
+        if self._clue is None and self.source is not None:
+            self._clue = self.source.clue(self.id)
+        return self._clue
+
+    @clue.setter
+    def clue(self, clue):
+        self._clue = clue
+
+    def fresh(self): # return an unplaced copy of the word
+        return Word(self.word, self._clue, self.id, normalized=True, source=self.source)
+
     def down_across(self): # return down or across
         if self.vertical:
             return 'down'
@@ -325,31 +762,114 @@ class Word(object):
     def __repr__(self):
         return self.word
 
+class WordRecord(object):
+    '''A placed, numbered word of a finished crossword.'''
+    def __init__(self, number, col, row, direction, answer, clue):
+        self.number = number
+        self.col = col
+        self.row = row
+        self.direction = direction # 'across' or 'down'
+        self.answer = answer
+        self.clue = clue
+
+    @property
+    def vertical(self):
+        return self.direction == 'down'
+
+    @property
+    def length(self):
+        return len(self.answer)
+
+    def to_dict(self):
+        return {'number': self.number, 'col': self.col, 'row': self.row, 'direction': self.direction,
+                'length': self.length, 'answer': self.answer, 'clue': self.clue}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['number'], d['col'], d['row'], d['direction'], d['answer'], d['clue'])
+
+    def __repr__(self):
+        return '%d. (%d,%d) %s %s' % (self.number, self.col, self.row, self.direction, self.answer)
+
+class CrosswordResult(object):
+    '''
+    A finished crossword for renderers and export: the grid cells and the numbered words.
+
+    cells is a list of rows, each a string of one character per cell with empty for the cells left blank.
+    Columns and rows are counted from 1, as on Crossword.
+    '''
+    def __init__(self, cols, rows, empty, cells, words, seed=None):
+        self.cols = cols
+        self.rows = rows
+        self.empty = empty
+        self.cells = cells
+        self.words = words
+        self.seed = seed
+
+    def cell(self, col, row):
+        return self.cells[row-1][col-1]
+
+    def numbers(self): # (col, row) -> number of the cells where words start
+        return {(word.col, word.row): word.number for word in self.words}
+
+    def across(self):
+        return [word for word in self.words if not word.vertical]
+
+    def down(self):
+        return [word for word in self.words if word.vertical]
+
+    def solution(self): # the solution grid, as Crossword.solution prints it
+        return ''.join(' '.join(row) + ' \n' for row in self.cells)
+
+    def to_dict(self):
+        return {'cols': self.cols, 'rows': self.rows, 'empty': self.empty, 'seed': self.seed,
+                'cells': self.cells, 'words': [word.to_dict() for word in self.words]}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['cols'], d['rows'], d['empty'], d['cells'], [WordRecord.from_dict(w) for w in d['words']], d['seed'])
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    @classmethod
+    def from_json(cls, s):
+        return cls.from_dict(json.loads(s))
+
+def _compute_worker(job): # runs in a pool process for compute_crossword_parallel
+    cols, rows, empty, maxloops, available_words, seed, time_permitted, spins, options, collect_stats = job
+    xword = Crossword(cols, rows, empty, maxloops, available_words, seed=seed,
+                      stats=SearchStats() if collect_stats else None)
+    xword.compute_crossword(time_permitted, spins, **options)
+    xword.uninstrument()
+    return xword
+
 ### end class, start execution
 
+demo_word_list = ['saffron', 'The dried, orange yellow plant used to as dye and as a cooking spice.'], \
+    ['pumpernickel', 'Dark, sour bread made from coarse ground rye.'], \
+    ['leaven', 'An agent, such as yeast, that cause batter or dough to rise..'], \
+    ['coda', 'Musical conclusion of a movement or composition.'], \
+    ['paladin', 'A heroic champion or paragon of chivalry.'], \
+    ['syncopation', 'Shifting the emphasis of a beat to the normally weak beat.'], \
+    ['albatross', 'A large bird of the ocean having a hooked beek and long, narrow wings.'], \
+    ['harp', 'Musical instrument with 46 or more open strings played by plucking.'], \
+    ['piston', 'A solid cylinder or disk that fits snugly in a larger cylinder and moves under pressure as in an engine.'], \
+    ['caramel', 'A smooth chery candy made from suger, butter, cream or milk with flavoring.'], \
+    ['coral', 'A rock-like deposit of organism skeletons that make up reefs.'], \
+    ['dawn', 'The time of each morning at which daylight begins.'], \
+    ['pitch', 'A resin derived from the sap of various pine trees.'], \
+    ['fjord', 'A long, narrow, deep inlet of the sea between steep slopes.'], \
+    ['lip', 'Either of two fleshy folds surrounding the mouth.'], \
+    ['lime', 'The egg-shaped citrus fruit having a green coloring and acidic juice.'], \
+    ['mist', 'A mass of fine water droplets in the air near or in contact with the ground.'], \
+    ['plague', 'A widespread affliction or calamity.'], \
+    ['yarn', 'A strand of twisted threads or a long elaborate narrative.'], \
+    ['snicker', 'A snide, slightly stifled laugh.']
+
 if __name__ == '__main__':
     #start_full = float(time.time())
-    word_list = ['saffron', 'The dried, orange yellow plant used to as dye and as a cooking spice.'], \
-        ['pumpernickel', 'Dark, sour bread made from coarse ground rye.'], \
-        ['leaven', 'An agent, such as yeast, that cause batter or dough to rise..'], \
-        ['coda', 'Musical conclusion of a movement or composition.'], \
-        ['paladin', 'A heroic champion or paragon of chivalry.'], \
-        ['syncopation', 'Shifting the emphasis of a beat to the normally weak beat.'], \
-        ['albatross', 'A large bird of the ocean having a hooked beek and long, narrow wings.'], \
-        ['harp', 'Musical instrument with 46 or more open strings played by plucking.'], \
-        ['piston', 'A solid cylinder or disk that fits snugly in a larger cylinder and moves under pressure as in an engine.'], \
-        ['caramel', 'A smooth chery candy made from suger, butter, cream or milk with flavoring.'], \
-        ['coral', 'A rock-like deposit of organism skeletons that make up reefs.'], \
-        ['dawn', 'The time of each morning at which daylight begins.'], \
-        ['pitch', 'A resin derived from the sap of various pine trees.'], \
-        ['fjord', 'A long, narrow, deep inlet of the sea between steep slopes.'], \
-        ['lip', 'Either of two fleshy folds surrounding the mouth.'], \
-        ['lime', 'The egg-shaped citrus fruit having a green coloring and acidic juice.'], \
-        ['mist', 'A mass of fine water droplets in the air near or in contact with the ground.'], \
-        ['plague', 'A widespread affliction or calamity.'], \
-        ['yarn', 'A strand of twisted threads or a long elaborate narrative.'], \
-        ['snicker', 'A snide, slightly stifled laugh.']
-
+    word_list = demo_word_list
     a = Crossword(25, 25, '-', 5000, word_list)
     a.compute_crossword(10)
     print(a.word_bank())
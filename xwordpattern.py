@@ -0,0 +1,431 @@
+"""Crosswords filled into a fixed pattern of blocks, slot by slot.
+
+Where Crossword grows a free-form grid out from a seed word, a PatternCrossword starts from a BlockPattern, either
+supplied or generated with rotational symmetry, and fills every across and down slot of it with a word of the
+right length, so the whole grid is used. Slots are filled most constrained first, with forward checking on the
+words that still fit each slot, looked up in the length and letter indexes of a WordIndex of the word list.
+
+Generated patterns that were filled are kept in a pattern cache directory, so later puzzles of the same size
+reuse known layouts instead of generating new ones.
+"""
+
+import random
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from wordindex import WordIndex
+from xwordgen_bh import Word, WordRecord, CrosswordResult
+
+block = '#'
+pattern_cache_version = 1
+
+
+class Slot(object):
+    '''A maximal run of two or more white cells across or down, the place of one word.'''
+    __slots__ = ('col', 'row', 'vertical', 'length', 'cells')
+
+    def __init__(self, col, row, vertical, length, cols):
+        self.col = col
+        self.row = row
+        self.vertical = vertical
+        self.length = length
+        step = cols if vertical else 1
+        self.cells = tuple((row - 1) * cols + col - 1 + i * step for i in range(length)) # positions in the grid
+
+    def __repr__(self):
+        return '(%d,%d) %s %d' % (self.col, self.row, 'down' if self.vertical else 'across', self.length)
+
+
+class BlockPattern(object):
+    '''
+    The blocks of a grid: cols by rows cells, with blocks a frozenset of the (col, row) cells that hold no letter.
+
+    Columns and rows are counted from 1, as on Crossword. Every white cell must be in a slot: a run of two or
+    more white cells across or down; a cell in runs of one both ways could not be clued.
+    '''
+    def __init__(self, cols, rows, blocks):
+        self.cols = cols
+        self.rows = rows
+        self.blocks = frozenset(blocks)
+
+    @classmethod
+    def from_rows(cls, lines):
+        '''Read a pattern from rows of characters, block for the blocks and anything else for white cells.'''
+        lines = [line.rstrip('\n') for line in lines if line.strip()]
+        if not lines or len(set(map(len, lines))) != 1:
+            raise ValueError('a pattern needs one or more rows, all of the same length')
+        return cls(len(lines[0]), len(lines),
+                   [(c, r) for r, line in enumerate(lines, 1) for c, char in enumerate(line, 1) if char == block])
+
+    @classmethod
+    def from_file(cls, path):
+        with Path(path).open(mode='r', encoding='utf-8') as f:
+            return cls.from_rows(f)
+
+    def to_rows(self, white='.'):
+        return [''.join(block if (c, r) in self.blocks else white for c in range(1, self.cols + 1))
+                for r in range(1, self.rows + 1)]
+
+    def key(self):
+        return (self.cols, self.rows, self.blocks)
+
+    def is_symmetric(self): # under a half turn
+        return all((self.cols + 1 - c, self.rows + 1 - r) in self.blocks for c, r in self.blocks)
+
+    def runs(self):
+        '''Yield (col, row, vertical, length) for each maximal run of white cells across and down, singles too.'''
+        for vertical, lines, length in ((0, self.rows, self.cols), (1, self.cols, self.rows)):
+            for line in range(1, lines + 1):
+                start = None
+                for i in range(1, length + 2):
+                    cell = (line, i) if vertical else (i, line)
+                    white = i <= length and cell not in self.blocks
+                    if white and start is None:
+                        start = i
+                    elif not white and start is not None:
+                        yield (line, start, 1, i - start) if vertical else (start, line, 0, i - start)
+                        start = None
+
+    def slots(self):
+        '''The slots of the pattern, across then down, with the slots of each cell; ValueError if a cell has none.'''
+        return compile_pattern(self.key())
+
+    @classmethod
+    def symmetric(cls, cols, rows, lengths, rng=random, min_length=3, attempts=1000):
+        '''
+        Generate a pattern with rotational symmetry, in the blocked style: white cells on every odd row and odd
+        column, so that only every other cell of a word is crossed.
+
+        lengths maps each word length to its weight, e.g. the number of words of that length in the word list;
+        runs are split with blocks into slots of those lengths, of at least min_length. cols and rows must be odd.
+        '''
+        if cols % 2 == 0 or rows % 2 == 0:
+            raise ValueError('symmetric patterns need an odd number of columns and rows')
+        lengths = {length: weight for length, weight in lengths.items() if length >= min_length and weight > 0}
+        if not lengths:
+            raise ValueError(f'no word lengths of at least {min_length} to fill a pattern with')
+        for attempt in range(attempts):
+            pattern = cls._try_symmetric(cols, rows, lengths, rng)
+            if pattern is not None and pattern._valid(lengths):
+                return pattern
+        raise ValueError(f'no symmetric {cols}x{rows} pattern found for word lengths {sorted(lengths)}')
+
+    @classmethod
+    def _try_symmetric(cls, cols, rows, lengths, rng):
+        blocks = {(c, r) for c in range(2, cols + 1, 2) for r in range(2, rows + 1, 2)}
+
+        def add(c, r): # a block and its mirror image
+            blocks.add((c, r))
+            blocks.add((cols + 1 - c, rows + 1 - r))
+
+        # across: split each odd row, the middle one into a palindrome
+        for r in range(1, (rows + 1) // 2 + 1, 2):
+            pieces = split_run(cols, lengths, rng, palindrome=(r == rows + 1 - r))
+            if pieces is None:
+                return None
+            for offset in block_offsets(pieces):
+                add(offset + 1, r)
+        # down: split the runs of each odd column, only at even rows so no across slot is broken
+        for c in range(1, (cols + 1) // 2 + 1, 2):
+            r = 1
+            while r <= rows:
+                if (c, r) in blocks:
+                    r += 1
+                    continue
+                end = r
+                while end + 1 <= rows and (c, end + 1) not in blocks:
+                    end += 1
+                n = end - r + 1
+                if n > 1:
+                    mirrored = c == cols + 1 - c and r + end == rows + 1
+                    if c == cols + 1 - c and r + end > rows + 1: # done as the mirror image of a run above
+                        break
+                    pieces = split_run(n, lengths, rng, palindrome=mirrored,
+                                       block_ok=lambda offset, r=r: (r + offset) % 2 == 0)
+                    if pieces is None:
+                        return None
+                    for offset in block_offsets(pieces):
+                        add(c, r + offset)
+                r = end + 1
+        return cls(cols, rows, blocks)
+
+    def _valid(self, lengths): # every run of two or more is a slot of a length in lengths, every white cell in one
+        try:
+            slots, cell_slots = self.slots()
+        except ValueError:
+            return False
+        return all(slot.length in lengths for slot in slots)
+
+
+def split_run(n, lengths, rng, palindrome=False, block_ok=None):
+    '''
+    Split a run of n cells into pieces of the given lengths, one block between each; return the piece lengths.
+
+    Lengths are chosen at random by weight. block_ok(offset) can rule out blocks at some
+    offsets from the start of the run. A palindrome is the same both ways, for runs that are their own mirror
+    image. Returns None if no split is possible.
+    '''
+    block_ok = block_ok or (lambda offset: True)
+
+    @lru_cache(maxsize=None)
+    def possible(start, end): # can cells start..end-1 be split
+        return (end - start) in lengths or any(
+            possible(start + length + 1, end) for length in lengths
+            if start + length < end - 1 and block_ok(start + length))
+
+    def split(start, end): # pieces for cells start..end-1, at random by weight
+        if not possible(start, end):
+            return None
+        pieces = []
+        while True:
+            options = [length for length in lengths
+                       if start + length < end - 1 and block_ok(start + length) and possible(start + length + 1, end)]
+            if end - start in lengths:
+                options.append(end - start)
+            length = rng.choices(options, [lengths[length] for length in options])[0]
+            pieces.append(length)
+            if start + length == end:
+                return pieces
+            start += length + 1
+
+    if not palindrome:
+        return split(0, n)
+    # a middle piece, or a middle block, with a split half either side of it mirrored
+    options = [m for m in lengths if m <= n and (n - m) % 2 == 0 and
+               (m == n or ((n - m) // 2 >= 2 and block_ok((n - m) // 2 - 1) and possible(0, (n - m) // 2 - 1)))]
+    if n % 2 == 1 and n >= 5 and block_ok(n // 2) and possible(0, n // 2):
+        options.append(0) # the middle block
+    if not options:
+        return None
+    middle = rng.choices(options, [lengths.get(m, 1) for m in options])[0]
+    if middle == n:
+        return [n]
+    half = split(0, (n - middle) // 2 - 1 if middle else n // 2)
+    if half is None:
+        return None
+    return half + ([middle] if middle else []) + half[::-1]
+
+
+def block_offsets(pieces): # the offsets of the blocks between the pieces of a split run
+    offset = -1
+    for piece in pieces[:-1]:
+        offset += piece + 1
+        yield offset
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(key):
+    '''The slots of a pattern and, per cell, [(slot, index in slot)], kept for the patterns used most recently.'''
+    cols, rows, blocks = key
+    pattern = BlockPattern(cols, rows, blocks)
+    slots = [Slot(col, row, vertical, length, cols) for col, row, vertical, length in pattern.runs() if length > 1]
+    cell_slots = {}
+    for slot in slots:
+        for i, pos in enumerate(slot.cells):
+            cell_slots.setdefault(pos, []).append((slot, i))
+    white = cols * rows - len(blocks)
+    if len(cell_slots) != white:
+        raise ValueError('a pattern has white cells in no slot, a run of two or more white cells')
+    return slots, cell_slots
+
+
+def load_patterns(cache_dir, cols, rows, min_length):
+    path = Path(cache_dir) / f"{cols}x{rows}-min{min_length}-v{pattern_cache_version}.patterns"
+    try:
+        with path.open(mode='r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return []
+    return [BlockPattern.from_rows(chunk.splitlines()) for chunk in text.split('\n\n') if chunk.strip()]
+
+
+def save_pattern(cache_dir, pattern, min_length):
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{pattern.cols}x{pattern.rows}-min{min_length}-v{pattern_cache_version}.patterns"
+    with path.open(mode='a', encoding='utf-8') as f:
+        f.write('\n'.join(pattern.to_rows()) + '\n\n') # one write, so concurrent appends do not interleave
+
+
+class PatternCrossword(object):
+    '''
+    A crossword filled into a BlockPattern: the supplied pattern, or symmetric ones generated per restart.
+
+    Has the parts of the Crossword interface that the output code uses: current_word_list, debug (the slot fill
+    nodes), density, solution and result. Words are [answer, clue] pairs or Word objects; each answer is used
+    at most once.
+    '''
+    def __init__(self, cols, rows, empty='-', available_words=[], seed=None, pattern=None, min_length=3,
+                 pattern_cache=None, max_patterns=64, stats=None):
+        if pattern is not None:
+            cols, rows = pattern.cols, pattern.rows
+        self.cols = cols
+        self.rows = rows
+        self.empty = empty
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.pattern = pattern
+        self.min_length = min_length
+        self.pattern_cache = pattern_cache # directory of generated patterns that were filled, see load_patterns
+        self.max_patterns = max_patterns # generate new patterns until the cache holds this many of the size
+        self.stats = stats
+        self.current_word_list = []
+        self.debug = 0
+        self.complete = False # whether every slot of the pattern is filled
+        self.available_words = []
+        seen = set()
+        for word in available_words:
+            word = word.fresh() if isinstance(word, Word) else Word(word[0], word[1])
+            if word.word not in seen and 1 < word.length <= max(cols, rows):
+                seen.add(word.word)
+                self.available_words.append(word)
+        # the answers indexed by length and letter, with ids the positions in available_words, which keep the clues
+        self.index = WordIndex.from_pairs((word.word, '') for word in self.available_words)
+        self.fits = {} # (length, position, letter) -> frozenset of the ids matching, taken from the index as needed
+        self.grid = [None] * (cols * rows) # the letter in each cell, or None
+
+    def compute_crossword(self, time_permitted=1.00, restarts=None, max_nodes=20000, branching=8):
+        '''
+        Fill a pattern, trying again with a fresh word order (and a fresh generated pattern) until one is filled.
+
+        Each restart explores at most max_nodes slot fill nodes, trying at most branching words per slot.
+        Stops after time_permitted seconds or the given number of restarts, either may be None; keeps the fill
+        with the most words if no pattern could be filled completely.
+        '''
+        if time_permitted is None and restarts is None:
+            raise ValueError('compute_crossword needs a time_permitted or restarts budget')
+        start = time.time()
+        deadline = start + float(time_permitted) if time_permitted is not None else None
+        count = 0
+        while not self.complete:
+            pattern, cached = self.choose_pattern()
+            filled, nodes = self.fill(pattern, max_nodes, branching, deadline)
+            count += 1
+            self.debug += nodes
+            if self.stats is not None:
+                self.stats.count('restarts')
+                self.stats.count('slot_nodes', nodes)
+            if filled is not None and len(filled) > len(self.current_word_list):
+                self.take_fill(filled, complete=len(filled) == len(pattern.slots()[0]))
+                if self.stats is not None:
+                    self.stats.record_best(len(self.current_word_list), self.density())
+            if self.complete and self.pattern is None and not cached and self.pattern_cache is not None:
+                save_pattern(self.pattern_cache, pattern, self.min_length)
+            if deadline is not None and time.time() >= deadline:
+                break
+            if restarts is not None and count >= restarts:
+                break
+        return
+
+    def fitting(self, length, position=None, letter=None): # the ids of the words of a length, with a letter
+        key = (length, position, letter)
+        ids = self.fits.get(key)
+        if ids is None:
+            ids = self.fits[key] = frozenset(self.index.matching(length, position, letter))
+        return ids
+
+    def choose_pattern(self): # the pattern to fill next, and whether it came from the pattern cache
+        if self.pattern is not None:
+            return self.pattern, False
+        if self.pattern_cache is not None:
+            cached = load_patterns(self.pattern_cache, self.cols, self.rows, self.min_length)
+            if len(cached) >= self.max_patterns or (cached and self.random.random() < len(cached) / self.max_patterns):
+                return self.random.choice(cached), True
+        lengths = {length: len(ids) for length, ids in self.index.by_length.items()}
+        return BlockPattern.symmetric(self.cols, self.rows, lengths, self.random, self.min_length), False
+
+    def fill(self, pattern, max_nodes, branching, deadline=None):
+        '''
+        Fill the slots of the pattern by backtracking, most constrained slot first; return (fill, nodes).
+
+        Each slot keeps the set of words that still fit the letters crossing it, narrowed by the index of the word
+        list as each crossing slot is filled, so a dead end shows as an empty set at once. The fill is a list of
+        (slot, word) for every slot if the pattern was filled, else for the most slots filled at once, or None if
+        no slot could be filled.
+        '''
+        slots, cell_slots = pattern.slots()
+        words, fitting, rng = self.available_words, self.fitting, self.random
+        letters = [None] * (pattern.cols * pattern.rows)
+        domains = {slot: fitting(slot.length) for slot in slots}
+        used = set() # answers in the grid
+        assigned = {} # slot -> word
+        best = []
+        nodes = 0
+
+        def search():
+            nonlocal nodes, best
+            nodes += 1
+            if len(assigned) > len(best):
+                best = list(assigned.items())
+            if len(assigned) == len(slots):
+                return True
+            if nodes >= max_nodes or (deadline is not None and nodes % 64 == 0 and time.time() >= deadline):
+                return False
+            slot = min((s for s in slots if s not in assigned), key=lambda s: len(domains[s]))
+            fits = [i for i in domains[slot] if words[i].word not in used]
+            for i in rng.sample(fits, min(branching, len(fits))):
+                word = words[i]
+                written, narrowed = [], [] # the new letters, and (slot, domain before) for the slots they narrowed
+                for pos, letter in zip(slot.cells, word.word):
+                    if letters[pos] is not None:
+                        continue
+                    letters[pos] = letter
+                    written.append(pos)
+                    for other, index in cell_slots[pos]:
+                        if other is not slot and other not in assigned:
+                            narrowed.append((other, domains[other]))
+                            domains[other] = domains[other] & fitting(other.length, index, letter)
+                assigned[slot] = word
+                used.add(word.word)
+                if all(domains[other] for other, domain in narrowed) and search():
+                    return True
+                del assigned[slot]
+                used.discard(word.word)
+                for other, domain in reversed(narrowed):
+                    domains[other] = domain
+                for pos in written:
+                    letters[pos] = None
+                if nodes >= max_nodes:
+                    return False
+            return False
+
+        search()
+        return (best or None), nodes
+
+    def take_fill(self, filled, complete): # place the words of a fill on the grid
+        self.grid = [None] * (self.cols * self.rows)
+        self.current_word_list = []
+        for slot, word in filled:
+            word = word.fresh()
+            word.col, word.row, word.vertical = slot.col, slot.row, slot.vertical
+            for pos, letter in zip(slot.cells, word.word):
+                self.grid[pos] = letter
+            self.current_word_list.append(word)
+        self.complete = complete
+        self.order_number_words()
+
+    def order_number_words(self): # numbers the words in reading order of their first cells, across before down
+        self.current_word_list.sort(key=lambda w: (w.row, w.col, bool(w.vertical)))
+        number, last = 0, None
+        for word in self.current_word_list:
+            if (word.col, word.row) != last:
+                number += 1
+                last = (word.col, word.row)
+            word.number = number
+
+    def density(self): # fraction of the grid's cells holding a letter
+        return sum(cell is not None for cell in self.grid) / len(self.grid)
+
+    def grid_rows(self):
+        return [''.join(cell or self.empty for cell in self.grid[r * self.cols:(r + 1) * self.cols])
+                for r in range(self.rows)]
+
+    def solution(self):
+        return ''.join(' '.join(row) + ' \n' for row in self.grid_rows())
+
+    def result(self, seed=None): # the crossword as a CrosswordResult, recording seed if given, as Crossword.result
+        words = [WordRecord(word.number, word.col, word.row, word.down_across(), word.word, word.clue)
+                 for word in self.current_word_list]
+        return CrosswordResult(self.cols, self.rows, self.empty, self.grid_rows(), words,
+                               self.seed if seed is None else seed)
@@ -0,0 +1,74 @@
+"""Counters and timers for the crossword search, to tune spins, maxloops and grid sizes against real word lists.
+
+A SearchStats is handed to Crossword(stats=...), which then instruments its own hot methods; a Crossword without
+one runs the plain methods, so the instrumentation costs nothing when it is off.
+"""
+
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+class SearchStats(object):
+    """Counts and phase timings from one or more searches, optionally emitted as JSON lines to a stream.
+
+    counts holds e.g. restarts, suggest_coord calls and the candidates they produced, check_fit_score calls and
+    rejections by reason (reject_off_grid, reject_ends, reject_collision, reject_adjacent, reject_overlap),
+    fit_and_add calls and successes and words placed; times holds the seconds spent in each phase of the search;
+    best holds (seconds since start, words placed, density) for each improvement on the best grid.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.counts = Counter()
+        self.times = defaultdict(float)
+        self.best = []
+
+    def __getstate__(self): # streams stay with the process that opened them
+        state = self.__dict__.copy()
+        state['stream'] = None
+        return state
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def record_best(self, words, density):
+        elapsed = self.elapsed()
+        self.best.append((elapsed, words, density))
+        self.emit('best', elapsed=round(elapsed, 6), restarts=self.counts['restarts'], words=words,
+                  density=round(density, 4))
+
+    def merge(self, other): # fold in the stats of a search run elsewhere, e.g. in a worker process
+        self.counts.update(other.counts)
+        for name, seconds in other.times.items():
+            self.times[name] += seconds
+        # the searches ran side by side, so only an entry with more words than any before it improved on them all
+        best = []
+        for entry in sorted(self.best + other.best):
+            if not best or entry[1] > best[-1][1]:
+                best.append(entry)
+        self.best = best
+
+    def to_dict(self):
+        return {'elapsed': round(self.elapsed(), 6), 'counts': dict(self.counts),
+                'times': {name: round(seconds, 6) for name, seconds in self.times.items()},
+                'best': [list(b) for b in self.best]}
+
+    def emit(self, event, **fields):
+        if self.stream is not None:
+            self.stream.write(json.dumps(dict(event=event, **fields)) + '\n')
+
+    def emit_summary(self):
+        self.emit('summary', **self.to_dict())
@@ -0,0 +1,165 @@
+"""An on-disk store of generated crosswords, to answer repeated requests and to skip duplicate puzzles.
+
+Each puzzle is kept in an SQLite database under the key of the request that made it: the hash of the word list,
+the grid size, the seed and the search parameters. Making the same request again is then a lookup instead of a
+search. Each puzzle also keeps a fingerprint of its set of answers, and the answers themselves in an index, so
+that a batch can skip a new puzzle that has the same words as, or nearly all the words of, one already made.
+
+The store is bounded: once it holds more than max_puzzles puzzles, or more than max_bytes of them, the least
+recently used are evicted. Several processes may use one store at a time.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from xwordgen_bh import CrosswordResult
+
+store_version = 1
+
+schema = """
+CREATE TABLE IF NOT EXISTS puzzles (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    seed INTEGER,
+    params TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    answer_count INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS puzzles_used ON puzzles (used);
+CREATE INDEX IF NOT EXISTS puzzles_fingerprint ON puzzles (fingerprint);
+CREATE TABLE IF NOT EXISTS answers (
+    answer TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (answer, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS answers_key ON answers (key);
+"""
+
+
+def request_key(word_list_hash, cols, rows, seed, params):
+    """The key of a request for a puzzle; params are the search parameters, as a JSON-serializable dict."""
+    request = {"version": store_version, "word_list": word_list_hash, "cols": cols, "rows": rows, "seed": seed,
+               "params": params}
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def answer_set(result):
+    return sorted({word.answer for word in result.words})
+
+
+def fingerprint(result):
+    """A hash of the set of answers of a CrosswordResult, the same for any layout of the same words."""
+    return hashlib.sha256("\n".join(answer_set(result)).encode("utf-8")).hexdigest()
+
+
+class PuzzleStore(object):
+    """Generated crosswords in an SQLite database at path, keyed by request_key.
+
+    Each puzzle is stored with a name (e.g. the name of its .tex file) and a summary, a JSON-serializable dict
+    of whatever the caller wants back on a cache hit.
+    """
+    def __init__(self, path, max_puzzles=10000, max_bytes=256 << 20, timeout=30.0):
+        self.path = Path(path)
+        self.max_puzzles = max_puzzles
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # autocommit, with explicit transactions where a check and a write must not interleave with other processes
+        self.db = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != store_version:
+            self.db.executescript("DROP TABLE IF EXISTS puzzles; DROP TABLE IF EXISTS answers;")
+            self.db.execute(f"PRAGMA user_version={store_version}")
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0]
+
+    def get(self, key):
+        """Return (name, CrosswordResult, summary) of the puzzle stored for key, or None, and mark it used."""
+        row = self.db.execute("SELECT name, result, summary FROM puzzles WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE puzzles SET used = ? WHERE key = ?", (time.time(), key))
+        name, result, summary = row
+        return name, CrosswordResult.from_json(result), json.loads(summary)
+
+    def similar(self, result, max_similarity=1.0, exclude=None):
+        """Return (name, similarity) of the stored puzzle whose answers are most like those of result, if its
+        similarity is at least max_similarity, else None.
+
+        Similarity is the Jaccard index of the two sets of answers: 1.0 for the same words, whatever the layout.
+        A puzzle with the same fingerprint is found through its index, without counting shared answers.
+        """
+        answers = answer_set(result)
+        if not answers:
+            return None
+        same = self.db.execute("SELECT name FROM puzzles WHERE fingerprint = ? AND key IS NOT ? LIMIT 1",
+                               (fingerprint(result), exclude)).fetchone()
+        if same is not None:
+            return same[0], 1.0
+        best = None
+        # the puzzles sharing any answer with result, with the number of answers they share
+        marks = ",".join("?" * len(answers))
+        rows = self.db.execute(f"SELECT p.name, p.answer_count, COUNT(*) FROM answers a JOIN puzzles p ON p.key = a.key "
+                               f"WHERE a.answer IN ({marks}) AND a.key IS NOT ? GROUP BY a.key", (*answers, exclude))
+        for name, answer_count, shared in rows:
+            similarity = shared / (len(answers) + answer_count - shared)
+            if similarity >= max_similarity and (best is None or similarity > best[1]):
+                best = name, similarity
+        return best
+
+    def put(self, key, name, result, summary=None, seed=None, params=None, max_similarity=None):
+        """Store result under key, then evict the least recently used puzzles over the bounds of the store.
+
+        With max_similarity, result is only stored if no other puzzle has a similarity of at least
+        max_similarity to it; returns (name, similarity) of that puzzle if there is one, else None.
+        """
+        text = result.to_json()
+        now = time.time()
+        answers = answer_set(result)
+        self.db.execute("BEGIN IMMEDIATE") # so two processes cannot both store near-duplicates of each other
+        try:
+            if max_similarity is not None:
+                duplicate = self.similar(result, max_similarity, exclude=key)
+                if duplicate is not None:
+                    self.db.execute("COMMIT")
+                    return duplicate
+            self.db.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self.db.execute("INSERT OR REPLACE INTO puzzles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (key, name, seed, json.dumps(params, sort_keys=True), fingerprint(result),
+                             len(answers), text, json.dumps(summary or {}), len(text), now, now))
+            self.db.executemany("INSERT INTO answers VALUES (?, ?)", ((answer, key) for answer in answers))
+            self.evict()
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return None
+
+    def evict(self):
+        """Delete the least recently used puzzles beyond max_puzzles, or beyond max_bytes of results."""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS evicted (key TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM evicted")
+        self.db.execute("INSERT INTO evicted SELECT key FROM ("
+                        "SELECT key, ROW_NUMBER() OVER w AS n, SUM(size) OVER w AS total FROM puzzles "
+                        "WINDOW w AS (ORDER BY used DESC, key)) WHERE n > ? OR total > ?",
+                        (self.max_puzzles, self.max_bytes))
+        self.db.execute("DELETE FROM answers WHERE key IN (SELECT key FROM evicted)")
+        self.db.execute("DELETE FROM puzzles WHERE key IN (SELECT key FROM evicted)")